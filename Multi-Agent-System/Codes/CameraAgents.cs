@@ -12,6 +12,9 @@ public class AgentVisionController : MonoBehaviour
     [SerializeField] private int streamPort = 5123; // Cambiado para coincidir con Python
     [SerializeField] private int quality = 75;
     [SerializeField] private float captureInterval = 0.033f;
+    // Protocolo fragmentado (FrameProtocol.py): permite frames de más de 64 KB
+    [SerializeField] private bool chunkedFrames = true;
+    [SerializeField] private int chunkSize = 60000;
 
     private Camera agentCamera;
     private RenderTexture renderTexture;
@@ -24,6 +27,11 @@ public class AgentVisionController : MonoBehaviour
     private Thread streamThread;
     private bool isStreaming = true;
     private ConcurrentQueue<byte[]> frameQueue = new ConcurrentQueue<byte[]>();
+    private uint frameId = 0;
+
+    // magic 'RVF1' | agentId int32 | frameId uint32 | chunkIndex uint16 | chunkCount uint16 | timestampMs int64
+    private static readonly byte[] FrameMagic = System.Text.Encoding.ASCII.GetBytes("RVF1");
+    private const int ChunkHeaderSize = 24;
 
     void Start()
     {
@@ -91,12 +99,19 @@ public class AgentVisionController : MonoBehaviour
                 RenderTexture.active = null;
 
                 byte[] frameData = screenShot.EncodeToJPG(quality);
-                byte[] header = BitConverter.GetBytes(agentId);
-                byte[] packetData = new byte[header.Length + frameData.Length];
-                header.CopyTo(packetData, 0);
-                frameData.CopyTo(packetData, header.Length);
+                if (chunkedFrames)
+                {
+                    EnqueueChunks(frameData);
+                }
+                else
+                {
+                    byte[] header = BitConverter.GetBytes(agentId);
+                    byte[] packetData = new byte[header.Length + frameData.Length];
+                    header.CopyTo(packetData, 0);
+                    frameData.CopyTo(packetData, header.Length);
 
-                frameQueue.Enqueue(packetData);
+                    frameQueue.Enqueue(packetData);
+                }
                 
                 frameCount++;
                 if (frameCount % 100 == 0) // Log cada 100 frames
@@ -109,6 +124,27 @@ public class AgentVisionController : MonoBehaviour
         }
     }
 
+    void EnqueueChunks(byte[] frameData)
+    {
+        long timestampMs = DateTimeOffset.UtcNow.ToUnixTimeMilliseconds();
+        int chunkCount = Math.Max(1, (frameData.Length + chunkSize - 1) / chunkSize);
+        for (int index = 0; index < chunkCount; index++)
+        {
+            int offset = index * chunkSize;
+            int length = Math.Min(chunkSize, frameData.Length - offset);
+            byte[] packetData = new byte[ChunkHeaderSize + length];
+            FrameMagic.CopyTo(packetData, 0);
+            BitConverter.GetBytes(agentId).CopyTo(packetData, 4);
+            BitConverter.GetBytes(frameId).CopyTo(packetData, 8);
+            BitConverter.GetBytes((ushort)index).CopyTo(packetData, 12);
+            BitConverter.GetBytes((ushort)chunkCount).CopyTo(packetData, 14);
+            BitConverter.GetBytes(timestampMs).CopyTo(packetData, 16);
+            Buffer.BlockCopy(frameData, offset, packetData, ChunkHeaderSize, length);
+            frameQueue.Enqueue(packetData);
+        }
+        frameId++;
+    }
+
     void StreamFrames()
     {
         int sentCount = 0;
@@ -1,112 +1,217 @@
-import torch
+import argparse
+import csv
+import glob
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
-from PIL import Image
-import matplotlib.pyplot as plt
+from Detectors import draw, load_detector
+
+logger = logging.getLogger(__name__)
+
+# Expandir clases relevantes para incluir más objetos similares
+RELEVANT_CLASSES = [39, 41, 44, 75]  # bottle, cup, bowl, vase
+SCALES = [1.0, 1.5, 0.75]  # Probar diferentes escalas
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+COLUMNS = ['image', 'variant', 'scale', 'class_id', 'class_name', 'confidence', 'x1', 'y1', 'x2', 'y2']
+
+
+def red_enhanced(img_rgb):
+    # Mejorar canal rojo para Coca-Cola
+    img = img_rgb.copy()
+    img[:, :, 0] = cv2.convertScaleAbs(img[:, :, 0], alpha=1.5, beta=10)
+    return img
+
+
+# Diferentes versiones de la imagen (entrada y salida RGB)
+PREPROCESSORS = {
+    'Original': lambda img_rgb: img_rgb,
+    'Contraste': lambda img_rgb: cv2.convertScaleAbs(img_rgb, alpha=1.8, beta=10),  # Aumentado contraste
+    'Histograma': lambda img_rgb: cv2.cvtColor(
+        cv2.equalizeHist(cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY)),
+        cv2.COLOR_GRAY2RGB
+    ),
+    'Gamma': lambda img_rgb: np.power(img_rgb/255.0, 1.8).clip(0, 1) * 255.0,  # Gamma más alto
+    'Sharpen': lambda img_rgb: cv2.filter2D(img_rgb, -1, np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])),
+    'Red Enhanced': red_enhanced,
+}
+
+
+def list_images(paths):
+    """
+    Expande carpetas (p. ej. vision_debug/) a sus imágenes; los archivos pasan tal cual
+    """
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images.extend(sorted(
+                p for p in glob.glob(os.path.join(path, '**', '*'), recursive=True)
+                if p.lower().endswith(IMAGE_EXTENSIONS)
+            ))
+        else:
+            images.append(path)
+    return images
+
+
+def prepare_variants(image_path):
+    """
+    Todas las combinaciones (versión, escala) de una imagen, ya en BGR uint8 como las
+    espera el detector
+    """
+    img_original = cv2.imread(image_path)
+    if img_original is None:
+        raise ValueError(f"No se pudo leer {image_path}")
+    img_rgb = cv2.cvtColor(img_original, cv2.COLOR_BGR2RGB)
+    variants = []
+    for version_name, preprocess in PREPROCESSORS.items():
+        # Normalizar imagen (el detector recibe BGR como OpenCV)
+        img = cv2.cvtColor(preprocess(img_rgb).astype(np.uint8), cv2.COLOR_RGB2BGR)
+        for scale in SCALES:
+            if scale != 1.0:
+                height, width = img.shape[:2]
+                scaled_img = cv2.resize(img, (int(width * scale), int(height * scale)))
+            else:
+                scaled_img = img
+            variants.append((version_name, scale, scaled_img))
+    return image_path, variants
+
+
+def prepared(image_paths, pool, lookahead, skipped=None):
+    """
+    prepare_variants en el pool, con a lo sumo lookahead imágenes por delante de la
+    inferencia para no tener la carpeta entera en memoria. Las imágenes ilegibles se
+    saltean con un aviso (y se agregan a skipped si se pasa una lista).
+    """
+    def result(future, image_path):
+        try:
+            return future.result()
+        except ValueError as e:
+            logger.warning(f"Salteando {image_path}: {e}")
+            if skipped is not None:
+                skipped.append(image_path)
+            return None
+
+    futures = deque()
+    for image_path in image_paths:
+        futures.append((pool.submit(prepare_variants, image_path), image_path))
+        if len(futures) > lookahead:
+            item = result(*futures.popleft())
+            if item is not None:
+                yield item
+    while futures:
+        item = result(*futures.popleft())
+        if item is not None:
+            yield item
+
+
+def sweep(image_paths, detector, workers=4, render_dir=None, classes=RELEVANT_CLASSES, skipped=None):
+    """
+    Corre cada (versión, escala) de cada imagen una sola vez con todas las clases
+    relevantes, en un solo lote por imagen. El preprocesamiento de las siguientes
+    imágenes corre en paralelo con la inferencia. Devuelve una fila por detección con
+    las cajas en coordenadas de la imagen original; las imágenes que no se pudieron
+    leer van a skipped.
+    """
+    names = detector.names
+    rows = []
+    if render_dir:
+        os.makedirs(render_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for image_path, variants in prepared(image_paths, pool, 2 * workers, skipped):
+            results = detector.detect([img for _, _, img in variants], classes=classes)
+            for (version_name, scale, img), detections in zip(variants, results):
+                for x1, y1, x2, y2, conf, cls in detections.tolist():
+                    rows.append({
+                        'image': image_path, 'variant': version_name, 'scale': scale,
+                        'class_id': int(cls), 'class_name': names[int(cls)], 'confidence': conf,
+                        'x1': x1 / scale, 'y1': y1 / scale, 'x2': x2 / scale, 'y2': y2 / scale,
+                    })
+                if render_dir and len(detections):
+                    # Guardar imagen con detecciones
+                    stem = os.path.splitext(os.path.basename(image_path))[0]
+                    output_path = os.path.join(render_dir, f'detection_{stem}_{version_name}_scale{scale}.png')
+                    cv2.imwrite(output_path, draw(img.copy(), detections, names))
+    return rows
+
+
+def write_table(rows, path):
+    """
+    CSV por defecto; .parquet necesita pandas con pyarrow
+    """
+    if path.endswith('.parquet'):
+        import pandas as pd
+        pd.DataFrame(rows, columns=COLUMNS).to_parquet(path, index=False)
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def summarize(rows):
+    """
+    Mejor confianza por (versión, escala) y cuántas imágenes tuvieron alguna detección
+    """
+    best = {}
+    for row in rows:
+        key = (row['variant'], row['scale'])
+        conf, images = best.get(key, (0.0, set()))
+        best[key] = (max(conf, row['confidence']), images | {row['image']})
+    return sorted(
+        ((variant, scale, conf, len(images)) for (variant, scale), (conf, images) in best.items()),
+        key=lambda item: (-item[3], -item[2]),
+    )
 
-def preprocess_and_test(image_path):
+
+def preprocess_and_test(image_path, detector=None):
     """
     Prueba múltiples preprocesamientos de la imagen con configuración mejorada
     """
-    # Cargar el modelo con configuración modificada
-    model = torch.hub.load('ultralytics/yolov5', 'yolov5s')
-    
-    # Expandir clases relevantes para incluir más objetos similares
-    relevant_classes = [39, 41, 44, 75]  # bottle, cup, bowl, vase
-    
+    import matplotlib.pyplot as plt
+
+    # Cargar el detector configurado (VISION_DETECTOR, ver Detectors.py)
+    model = detector or load_detector()
+
     # Ajustar la confianza mínima
     model.conf = 0.25  # Reducir el umbral de confianza
-    
-    # Leer la imagen original
-    img_original = cv2.imread(image_path)
-    img_rgb = cv2.cvtColor(img_original, cv2.COLOR_BGR2RGB)
-    
+
     # Crear visualización de debug
+    _, variants = prepare_variants(image_path)
     plt.figure(figsize=(20, 15))
-    
-    # Preparar diferentes versiones de la imagen
-    preprocessed_images = {
-        'Original': img_rgb,
-        'Contraste': cv2.convertScaleAbs(img_rgb, alpha=1.8, beta=10),  # Aumentado contraste
-        'Histograma': cv2.cvtColor(
-            cv2.equalizeHist(cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY)),
-            cv2.COLOR_GRAY2RGB
-        ),
-        'Gamma': np.power(img_rgb/255.0, 1.8).clip(0, 1) * 255.0,  # Gamma más alto
-        'Sharpen': cv2.filter2D(img_rgb, -1, np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])),
-        'Red Enhanced': img_rgb.copy()
-    }
-    
-    # Mejorar canal rojo para Coca-Cola
-    preprocessed_images['Red Enhanced'][:,:,0] = cv2.convertScaleAbs(
-        preprocessed_images['Red Enhanced'][:,:,0], 
-        alpha=1.5, 
-        beta=10
-    )
-    
+
     # Mostrar todas las versiones
-    for idx, (name, img) in enumerate(preprocessed_images.items(), 1):
+    originals = [(name, img) for name, scale, img in variants if scale == 1.0]
+    for idx, (name, img) in enumerate(originals, 1):
         plt.subplot(2, 3, idx)
-        plt.imshow(img.astype(np.uint8))
+        plt.imshow(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
         plt.title(name)
-    
+
     # Guardar visualización
     plt.savefig('preprocessing_debug.png')
     plt.close()
-    
-    best_confidence = 0
-    best_detection = None
-    best_version = None
-    
+
     print("\nProbando diferentes preprocesamientos:")
     print("-" * 50)
-    
-    for version_name, img in preprocessed_images.items():
-        print(f"\nProbando versión: {version_name}")
-        
-        # Normalizar imagen
-        img = img.astype(np.uint8)
-        
-        # Probar detección con diferentes tamaños
-        scales = [1.0, 1.5, 0.75]  # Probar diferentes escalas
-        for scale in scales:
-            if scale != 1.0:
-                height, width = img.shape[:2]
-                new_height, new_width = int(height * scale), int(width * scale)
-                scaled_img = cv2.resize(img, (new_width, new_height))
-            else:
-                scaled_img = img
-                
-            # Probar con diferentes clases
-            for class_id in relevant_classes:
-                model.classes = [class_id]
-                results = model(scaled_img)
-                detections = results.pandas().xyxy[0]
-                
-                if not detections.empty:
-                    max_conf = detections['confidence'].max()
-                    if max_conf > best_confidence:
-                        best_confidence = max_conf
-                        best_detection = detections
-                        best_version = f"{version_name} (scale: {scale})"
-                    
-                    print(f"Clase {class_id} - Escala {scale} - Detecciones:")
-                    print(detections)
-                    
-                    # Guardar imagen con detecciones
-                    results.render()
-                    output_path = f'detection_{version_name}_class{class_id}_scale{scale}.png'
-                    Image.fromarray(results.ims[0]).save(output_path)
-    
-    if best_detection is not None:
+
+    rows = sweep([image_path], model, render_dir='.')
+    for row in rows:
+        print(f"{row['variant']} - Escala {row['scale']} - {row['class_name']} ({row['class_id']}): "
+              f"{row['confidence']:.3f}")
+
+    if rows:
+        best = max(rows, key=lambda row: row['confidence'])
         print("\nMejor detección encontrada:")
-        print(f"Versión: {best_version}")
-        print(f"Confianza: {best_confidence}")
-        print(best_detection)
+        print(f"Versión: {best['variant']} (scale: {best['scale']})")
+        print(f"Confianza: {best['confidence']}")
+        print(best)
     else:
         print("\nNo se encontraron detecciones en ninguna versión")
-        
+
         # Análisis detallado de la imagen
+        img_rgb = cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2RGB)
         print("\nAnálisis de la imagen:")
         print("1. Dimensiones:", img_rgb.shape)
         print("2. Estadísticas de color (RGB):")
@@ -116,10 +221,30 @@ def preprocess_and_test(image_path):
             print(f"      min={values.min()}, max={values.max()}")
             print(f"      mean={values.mean():.2f}, std={values.std():.2f}")
             print(f"      median={np.median(values):.2f}")
+    return rows
 
 def main():
-    image_path = 'vision_debug/agent0_detection_20241114_161634_025906.png'
-    preprocess_and_test(image_path)
+    parser = argparse.ArgumentParser(description="Barrido de preprocesamientos sobre capturas de vision_debug")
+    parser.add_argument('paths', nargs='*', default=['vision_debug'], help="imágenes o carpetas")
+    parser.add_argument('--out', default='preprocessing_sweep.csv', help=".csv o .parquet")
+    parser.add_argument('--render', metavar='DIR', help="guardar imágenes con detecciones en DIR")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--detector', help="backend de Detectors.py (por defecto VISION_DETECTOR)")
+    parser.add_argument('--conf', type=float, default=0.25)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    image_paths = list_images(args.paths)
+    detector = load_detector(args.detector, conf=args.conf)
+    skipped = []
+    rows = sweep(image_paths, detector, workers=args.workers, render_dir=args.render, skipped=skipped)
+    write_table(rows, args.out)
+
+    print(f"{len(image_paths) - len(skipped)} imágenes, {len(skipped)} salteadas (ilegibles), "
+          f"{len(rows)} detecciones -> {args.out}")
+    print(f"{'versión':>14} {'escala':>6} {'mejor conf':>10} {'imágenes':>8}")
+    for variant, scale, conf, images in summarize(rows):
+        print(f"{variant:>14} {scale:>6} {conf:>10.3f} {images:>8}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -5,176 +5,1126 @@ import threading
 import struct
 import time
 import logging
-import torch
+import importlib
+import os
+import queue
+import selectors
+from concurrent.futures import Future
+import multiprocessing
+from multiprocessing import shared_memory
+from Detectors import BACKEND_MODULES, agreement, configured_backend, load_detector
+from FrameProtocol import Reassembler, chunk_agent_id, is_chunked
+from VisionMetrics import Histogram, MetricsServer, RateMeter
+from VisionStream import GridCompositor, VisionStreamServer
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+def load_model(backend=None, weights=None):
+    """
+    Carga el detector YOLOv5 configurado (ver Detectors.load_detector); el backend de
+    PyTorch lo mueve a GPU si está disponible
+    """
+    logger.info("Cargando modelo YOLOv5...")
+    model = load_detector(backend, weights)
+    logger.info(f"Modelo YOLOv5 cargado en dispositivo: {model.device}")
+    return model, model.device
+
+# Detecciones compactas por frame: una fila por caja que supera el umbral
+DETECTION_DTYPE = np.dtype([
+    ('x1', np.int32), ('y1', np.int32), ('x2', np.int32), ('y2', np.int32),
+    ('conf', np.float32), ('cls', np.int16),
+])
+
+def to_detections(xyxy, conf_threshold=0.5):
+    """
+    Convierte la salida del detector (N x 6: x1, y1, x2, y2, conf, cls) en un arreglo
+    estructurado DETECTION_DTYPE, filtrando con una máscara en lugar de recorrerla
+    fila por fila.
+    """
+    rows = np.asarray(xyxy)
+    rows = rows[rows[:, 4] > conf_threshold]
+    detections = np.empty(len(rows), dtype=DETECTION_DTYPE)
+    boxes = rows[:, :4].astype(np.int32)
+    detections['x1'], detections['y1'], detections['x2'], detections['y2'] = boxes.T
+    detections['conf'] = rows[:, 4]
+    detections['cls'] = rows[:, 5]
+    return detections
+
+class SharedSegment:
+    """
+    Bloque de memoria compartida con nombre: el dueño lo crea y lo borra al cerrar,
+    los demás procesos lo abren con name=... y create=False.
+    """
+    def __init__(self, size, name=None, create=True):
+        self.owner = create
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        if self.owner:
+            self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # Todavía hay vistas vivas (hilos daemon); el segmento se libera al salir
+            pass
+
+class FrameRing(SharedSegment):
+    """
+    Anillo preasignado de slots 240x320x3 por agente en memoria compartida. Cada agente
+    tiene un contador de secuencia: el escritor llena el slot siguiente y luego publica
+    incrementando la secuencia, así los lectores saben qué cambió sin copiar nada.
+    """
+    SHAPE = (240, 320, 3)
+
+    def __init__(self, num_agents, slots=3, name=None, create=True):
+        if slots < 2:
+            # Con un solo slot el escritor pisa el frame publicado y read() nunca termina
+            raise ValueError(f"FrameRing necesita al menos 2 slots por agente (ring_slots={slots})")
+        self.num_agents = num_agents
+        self.slots = slots
+        header = num_agents * np.dtype(np.int64).itemsize
+        super().__init__(header + num_agents * slots * int(np.prod(self.SHAPE)), name, create)
+        self.seq = np.ndarray((num_agents,), dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray((num_agents, slots) + self.SHAPE, dtype=np.uint8,
+                                 buffer=self.shm.buf, offset=header)
+        if create:
+            self.seq[:] = 0
+
+    def next_slot(self, agent_id):
+        """Slot donde escribir el próximo frame del agente (todavía no visible)"""
+        return self.frames[agent_id, (self.seq[agent_id] + 1) % self.slots]
+
+    def publish(self, agent_id):
+        self.seq[agent_id] += 1
+
+    def write(self, agent_id, frame):
+        np.copyto(self.next_slot(agent_id), frame)
+        self.publish(agent_id)
+
+    def latest(self, agent_id):
+        """(secuencia, vista del último frame publicado); secuencia 0 = todavía nada"""
+        seq = int(self.seq[agent_id])
+        return seq, self.frames[agent_id, seq % self.slots]
+
+    def read(self, agent_id, out=None):
+        """
+        (secuencia, copia del último frame publicado). El escritor vuelve a llenar el
+        mismo slot recién slots - 1 publicaciones después; si la secuencia avanzó tanto
+        durante la copia, esta pudo quedar mezclada y se repite.
+        """
+        while True:
+            seq, frame = self.latest(agent_id)
+            if out is None:
+                out = frame.copy()
+            else:
+                np.copyto(out, frame)
+            if int(self.seq[agent_id]) - seq < self.slots - 1:
+                return seq, out
+
+class DetectionTable(SharedSegment):
+    """
+    Últimas detecciones de cada agente en memoria compartida: hasta max_detections filas
+    DETECTION_DTYPE por agente más la cantidad válida y un contador de secuencia.
+    """
+    def __init__(self, num_agents, max_detections=64, name=None, create=True):
+        self.num_agents = num_agents
+        self.max_detections = max_detections
+        header = 2 * num_agents * np.dtype(np.int64).itemsize
+        super().__init__(header + num_agents * max_detections * DETECTION_DTYPE.itemsize, name, create)
+        meta = np.ndarray((2, num_agents), dtype=np.int64, buffer=self.shm.buf)
+        self.seq, self.counts = meta
+        self.rows = np.ndarray((num_agents, max_detections), dtype=DETECTION_DTYPE,
+                               buffer=self.shm.buf, offset=header)
+        if create:
+            meta[:] = 0
+
+    def write(self, agent_id, detections):
+        count = min(len(detections), self.max_detections)
+        self.rows[agent_id, :count] = detections[:count]
+        self.counts[agent_id] = count
+        self.seq[agent_id] += 1
+
+    def read(self, agent_id):
+        return self.rows[agent_id, :self.counts[agent_id]].copy()
+
+def detection_rows(detections):
+    """Arreglo DETECTION_DTYPE -> N x 6 float (x1, y1, x2, y2, conf, cls)"""
+    return np.column_stack([detections[field] for field in DETECTION_DTYPE.names]).astype(np.float32)
+
+class MotionGate:
+    """
+    Decide por agente si un frame necesita YOLO. Compara una firma en gris reducida con
+    la del frame anterior: si la imagen se desplazó mueve las cajas lo mismo (correlación
+    de fase), si casi no cambió reutiliza las detecciones, y si cambió de otra forma (o
+    toca keyframe) pide una detección completa. En cada keyframe mide cuánto se
+    habían desviado las cajas propagadas respecto de la detección nueva.
+    """
+    SIGNATURE_SIZE = (80, 60)
+    COUNTERS = ('frames', 'keyframes', 'reused', 'tracked', 'drift_checks', 'drift_matched',
+                'drift_missed', 'drift_extra')
+
+    def __init__(self, keyframe_interval=10, change_threshold=0.02, track_threshold=0.15,
+                 min_response=0.2):
+        self.keyframe_interval = keyframe_interval
+        self.change_threshold = change_threshold
+        self.track_threshold = track_threshold
+        self.min_response = min_response
+        self.lock = threading.Lock()
+        self.reference = None
+        self.detections = None
+        self.since_keyframe = 0
+        self.window = cv2.createHanningWindow(self.SIGNATURE_SIZE, cv2.CV_32F)
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.drift_iou_total = 0.0
+
+    def signature(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def decide(self, frame):
+        """
+        Devuelve (acción, detecciones, firma); acción es 'detect', 'reuse' o 'track'.
+        Con 'detect' hay que llamar a keyframe() con el resultado de YOLO.
+        """
+        signature = self.signature(frame)
+        with self.lock:
+            self.counters['frames'] += 1
+            action = 'detect'
+            if self.detections is not None and self.since_keyframe < self.keyframe_interval:
+                change = float(np.mean(np.abs(signature - self.reference))) / 255
+                if change < self.track_threshold:
+                    # Un paneo lento cambia poco la firma pero igual mueve las cajas:
+                    # primero se mira si hubo desplazamiento, después si hubo cambio
+                    # Copias: con ventana, phaseCorrelate puede escribir sobre sus entradas
+                    (dx, dy), response = cv2.phaseCorrelate(
+                        self.reference.copy(), signature.copy(), self.window)
+                    if response >= self.min_response and max(abs(dx), abs(dy)) >= 0.25:
+                        self._shift(dx * frame.shape[1] / self.SIGNATURE_SIZE[0],
+                                    dy * frame.shape[0] / self.SIGNATURE_SIZE[1], frame.shape)
+                        action = 'track'
+                    elif change < self.change_threshold:
+                        action = 'reuse'
+            if action == 'detect':
+                return action, None, signature
+            self.counters['reused' if action == 'reuse' else 'tracked'] += 1
+            self.reference = signature
+            self.since_keyframe += 1
+            return action, self.detections, signature
+
+    def _shift(self, dx, dy, shape):
+        moved = self.detections.copy()
+        for x_field in ('x1', 'x2'):
+            moved[x_field] = np.clip(moved[x_field] + round(dx), 0, shape[1])
+        for y_field in ('y1', 'y2'):
+            moved[y_field] = np.clip(moved[y_field] + round(dy), 0, shape[0])
+        # Las cajas que salieron del frame quedan con área cero después del recorte
+        self.detections = moved[(moved['x2'] > moved['x1']) & (moved['y2'] > moved['y1'])]
+
+    def keyframe(self, signature, detections):
+        with self.lock:
+            if self.detections is not None and self.since_keyframe:
+                # Deriva: cajas propagadas desde el último keyframe vs la detección nueva
+                matched, reference, candidate, ious = agreement(
+                    detection_rows(detections), detection_rows(self.detections))
+                self.counters['drift_checks'] += 1
+                self.counters['drift_matched'] += matched
+                self.counters['drift_missed'] += reference - matched
+                self.counters['drift_extra'] += candidate - matched
+                self.drift_iou_total += sum(ious)
+            self.counters['keyframes'] += 1
+            self.reference = signature
+            self.detections = detections
+            self.since_keyframe = 0
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['saved_fraction'] = 1 - stats['keyframes'] / stats['frames'] if stats['frames'] else 0.0
+            stats['drift_mean_iou'] = (float(self.drift_iou_total) / stats['drift_matched']
+                                       if stats['drift_matched'] else 0.0)
+            return stats
+
+class InferenceBatcher:
+    """
+    Etapa central de inferencia: los hilos receptores encolan frames y un solo hilo
+    junta hasta max_batch frames (o espera como mucho max_wait_ms) y hace una pasada
+    de YOLO por lote. Cada agente recibe sus detecciones por un Future.
+    """
+    def __init__(self, model, max_batch=8, max_wait_ms=10):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.running = True
+        self.stats_lock = threading.Lock()
+        self.frames = 0
+        self.batches = 0
+        self.latency_total = 0.0
+        # Duración de cada pasada del modelo (un lote)
+        self.forward = Histogram()
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, name="InferenceBatcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, agent_id, frame):
+        future = Future()
+        self.queue.put((agent_id, frame, future, time.perf_counter()))
+        return future
+
+    def infer(self, agent_id, frame):
+        return self.submit(agent_id, frame).result()
+
+    def _collect(self):
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self.running:
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                # Una sola pasada para todo el lote; el detector devuelve un arreglo por imagen
+                with self.forward.time():
+                    results = self.model.detect([frame for _, frame, _, _ in batch])
+                for (_, _, future, _), detections in zip(batch, results):
+                    future.set_result(detections)
+            except Exception as e:
+                logger.error(f"Error en inferencia por lotes: {e}")
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            done = time.perf_counter()
+            with self.stats_lock:
+                self.frames += len(batch)
+                self.batches += 1
+                self.latency_total += sum(done - submitted for _, _, _, submitted in batch)
+
+    def stats(self):
+        with self.stats_lock:
+            elapsed = time.perf_counter() - self.started
+            return {
+                'frames': self.frames,
+                'batches': self.batches,
+                'fps': self.frames / elapsed if elapsed else 0.0,
+                'mean_batch': self.frames / self.batches if self.batches else 0.0,
+                'mean_latency_ms': self.latency_total / self.frames * 1000 if self.frames else 0.0,
+            }
+
+    def stop(self):
+        self.running = False
+
+class LatestFrame:
+    """
+    Buzón de un solo frame por agente: put() reemplaza el que esté pendiente, así la
+    decodificación y la inferencia siempre trabajan sobre el más reciente.
+    """
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.item = None
+
+    def put(self, item):
+        """Guarda el frame y devuelve True si pisó uno que nadie había tomado"""
+        with self.cond:
+            replaced = self.item is not None
+            self.item = item
+            self.cond.notify()
+            return replaced
+
+    def take(self, timeout=None):
+        with self.cond:
+            if self.item is None:
+                self.cond.wait(timeout)
+            item, self.item = self.item, None
+            return item
+
+class Stage:
+    """
+    Etapa del pipeline de visión: un pool de hilos toma elementos de una cola acotada,
+    aplica fn y pasa el resultado a la siguiente etapa. Si la cola está llena se
+    descarta el elemento más viejo (on_drop recibe el descartado) para no acumular retraso.
+    Con gate, los hilos no toman nada hasta que el evento se active.
+    """
+    def __init__(self, name, fn, workers=1, maxsize=8, on_drop=None, gate=None):
+        self.name = name
+        self.gate = gate
+        self.fn = fn
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.next_stage = None
+        self.on_drop = on_drop
+        self.running = True
+        self.stats_lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.busy_total = 0.0
+        self.latency = Histogram()
+        self.threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def then(self, stage):
+        self.next_stage = stage
+        return stage
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    stale = self.queue.get_nowait()
+                except queue.Empty:
+                    continue
+                with self.stats_lock:
+                    self.dropped += 1
+                if self.on_drop:
+                    self.on_drop(stale)
+
+    def _run(self):
+        while self.running:
+            if self.gate is not None and not self.gate.wait(0.5):
+                continue
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            try:
+                result = self.fn(item)
+            except Exception as e:
+                logger.error(f"Error en etapa {self.name}: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            self.latency.observe(elapsed)
+            with self.stats_lock:
+                self.processed += 1
+                self.busy_total += elapsed
+            if result is not None and self.next_stage is not None:
+                self.next_stage.put(result)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'workers': len(self.threads),
+                'depth': self.queue.qsize(),
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'mean_ms': self.busy_total / self.processed * 1000 if self.processed else 0.0,
+            }
+
+    def stop(self):
+        self.running = False
+
 class AgentVisionReceiver:
-    def __init__(self, num_agents=5, base_port=5123):
+    COUNTERS = ('received', 'dropped', 'decoded', 'inferred', 'published')
+
+    def __init__(self, num_agents=5, base_port=5123, max_batch=8, max_wait_ms=10,
+                 decode_workers=2, resize_workers=1, infer_workers=None, annotate_workers=1,
+                 conf_threshold=0.5, headless=False, ring_slots=3, shm_name=None,
+                 agent_ids=None, ring=None, table=None, backend=None, weights=None,
+                 threads=None, on_ready=None, on_failed=None, reassembly_timeout=0.5, shared_port=None,
+                 motion_gate=True, keyframe_interval=10, change_threshold=0.02, track_threshold=0.15,
+                 stream_port=None, stream_host='127.0.0.1', metrics_port=None, metrics_host='127.0.0.1'):
         self.num_agents = num_agents
         self.base_port = base_port
+        # Agentes (puertos) que atiende este receptor; en modo multiproceso cada proceso
+        # recibe un subconjunto y comparte anillo y tabla de detecciones con el padre
+        self.agent_ids = list(range(num_agents) if agent_ids is None else agent_ids)
         self.running = True
-        self.frame_buffer = {}
+        self.stopped = False
+        self.stop_lock = threading.Lock()
+        # Último frame de cada agente en memoria compartida, sin copias por diccionario
+        self.ring = ring or FrameRing(num_agents, slots=ring_slots, name=shm_name)
+        self.table = table or DetectionTable(num_agents)
         self.lock = threading.Lock()
+        self.conf_threshold = conf_threshold
+        # Sin ventana ni dibujo: solo se publican las detecciones
+        self.headless = headless
+        # Con stream_port la grilla se sirve como MJPEG por HTTP en vez de abrir ventana
+        self.stream_port = stream_port
+        self.stream_host = stream_host
+        self.stream = None
+        self.pending = {i: LatestFrame() for i in self.agent_ids}
+        # Número de llegada por agente: viaja con el frame por todas las etapas para que,
+        # con varios hilos por etapa, un frame viejo no pase delante de uno más nuevo
+        self.arrivals = dict.fromkeys(self.agent_ids, 0)
+        self.inferred_seq = dict.fromkeys(self.agent_ids, 0)
+        self.published_seq = dict.fromkeys(self.agent_ids, 0)
+        self.infer_locks = {i: threading.Lock() for i in self.agent_ids}
+        self.counters = {i: dict.fromkeys(self.COUNTERS, 0) for i in self.agent_ids}
+        self.counters_lock = threading.Lock()
+        # Frames fragmentados (FrameProtocol): un rearmador por agente, solo lo usa su receptor
+        self.reassemblers = {i: Reassembler(reassembly_timeout) for i in self.agent_ids}
+        # Con shared_port todos los agentes envían a un solo puerto y se separan por el
+        # agent_id de la cabecera; si no, un puerto por agente (base_port + agent_id)
+        self.shared_port = shared_port
+        self.socket_counters = dict.fromkeys(('datagrams', 'truncated', 'unknown_agent'), 0)
+        # Latencias por etapa (las del pipeline las lleva cada Stage) y fps publicados por
+        # agente; se leen con metrics() o por HTTP en metrics_port
+        # handle: rearmado y entrega al pipeline de cada datagrama (sin contar la lectura del socket)
+        self.handle_latency = Histogram(shared=False)
+        self.display_latency = Histogram()
+        self.rates = {i: RateMeter() for i in self.agent_ids}
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.metrics_server = None
+        # YOLO solo cuando el frame cambió o toca keyframe; entre medio se reutilizan o
+        # se desplazan las cajas anteriores
+        self.gates = {
+            i: MotionGate(keyframe_interval, change_threshold, track_threshold) for i in self.agent_ids
+        } if motion_gate else {}
+        
+        # El modelo se carga en segundo plano para que los sockets se abran de inmediato;
+        # hasta que ready esté activo la etapa de inferencia espera y las colas acotadas
+        # guardan los frames más recientes
+        self.model = None
+        self.device = None
+        self.batcher = None
+        self.ready = threading.Event()
+        self.on_ready = on_ready
+        # Si la carga falla no habrá inferencia nunca: se guarda el error, se detiene el
+        # pipeline y wait_ready lo propaga en vez de esperar para siempre
+        self.failed = threading.Event()
+        self.load_error = None
+        self.on_failed = on_failed
+        self.created = time.perf_counter()
+        self.startup = {}
+        self.loader = threading.Thread(
+            target=self._load_model,
+            args=(backend, weights, threads, max_batch, max_wait_ms),
+            name="ModelLoader",
+            daemon=True,
+        )
+        self.loader.start()
         
-        # Cargar modelo YOLOv5
-        logger.info("Cargando modelo YOLOv5...")
-        self.model = torch.hub.load('ultralytics/yolov5', 'yolov5s')
-        # Configurar el modelo para usar GPU si está disponible
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.model.to(self.device)
-        logger.info(f"Modelo YOLOv5 cargado en dispositivo: {self.device}")
+        # decode -> resize -> infer -> annotate, cada etapa con su propio pool. La decodificación
+        # JPEG y el resize de OpenCV sueltan el GIL, así que se solapan con la inferencia.
+        # Hacen falta al menos max_batch hilos de inferencia para que el batcher llene lotes
+        # (cada agente tiene a lo sumo un frame en inferencia, así que los lotes son entre agentes).
+        # Las colas caben un frame por agente y un lote completo que sale de golpe de la inferencia.
+        infer_workers = infer_workers or max_batch
+        queue_size = max(len(self.agent_ids), infer_workers)
+        on_drop = lambda item: self._count(item[0], 'dropped')
+        self.stages = {
+            'decode': Stage('decode', self._decode, decode_workers, queue_size, on_drop),
+            'resize': Stage('resize', self._resize, resize_workers, queue_size, on_drop),
+            'infer': Stage('infer', self._infer, infer_workers, queue_size, on_drop, gate=self.ready),
+            'annotate': Stage('annotate', self._annotate, annotate_workers, queue_size, on_drop),
+        }
+        self.stages['decode'].then(self.stages['resize']).then(self.stages['infer']).then(self.stages['annotate'])
         
-        logger.info(f"Iniciando AgentVisionReceiver con {num_agents} agentes")
+        logger.info(f"Iniciando AgentVisionReceiver con agentes {self.agent_ids}")
         
-    def process_frame_yolo(self, frame):
+    def _load_model(self, backend, weights, threads, max_batch, max_wait_ms):
         """
-        Procesa un frame usando YOLOv5 y dibuja las detecciones
+        Importa el backend, carga el modelo, hace una inferencia de calentamiento con un
+        lote completo al tamaño de entrada del pipeline y marca el receptor como listo
         """
         try:
-            # Realizar inferencia
-            results = self.model(frame)
-            
-            # Obtener detecciones
-            detections = results.xyxy[0]  # Tensor de detecciones en formato xyxy
-            
-            # Dibujar detecciones
-            for detection in detections:
-                x1, y1, x2, y2, conf, cls = detection.cpu().numpy()
-                if conf > 0.5:  # Umbral de confianza
-                    # Convertir coordenadas a enteros
-                    box = np.array([x1, y1, x2, y2]).astype(int)
-                    # Obtener etiqueta y confianza
-                    label = f"{self.model.names[int(cls)]} {conf:.2f}"
-                    # Dibujar bbox
-                    cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), (0, 255, 0), 2)
-                    # Dibujar etiqueta
-                    cv2.putText(frame, label, (box[0], box[1]-10),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                    
-            return frame
-            
+            backend = configured_backend(backend)
+            start = time.perf_counter()
+            importlib.import_module(BACKEND_MODULES.get(backend, 'torch'))
+            imported = time.perf_counter()
+            model, device = load_model(backend, weights)
+            if threads:
+                model.set_threads(threads)
+            loaded = time.perf_counter()
+            model.detect([np.zeros(FrameRing.SHAPE, dtype=np.uint8)] * max_batch)
+            warmed = time.perf_counter()
         except Exception as e:
-            logger.error(f"Error en proceso YOLO: {e}")
-            return frame
-    
+            logger.error(f"Error cargando el modelo: {e}")
+            self.load_error = e
+            self.startup = {'error': repr(e), 'failed_s': time.perf_counter() - self.created}
+            self.failed.set()
+            self._stop_pipeline()
+            if self.on_failed:
+                self.on_failed()
+            return
+        
+        self.model, self.device = model, device
+        # Inferencia compartida entre todos los agentes
+        self.batcher = InferenceBatcher(model, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        self.startup = {
+            'import_s': imported - start,
+            'load_s': loaded - imported,
+            'warmup_s': warmed - loaded,
+            'ready_s': warmed - self.created,
+        }
+        self.ready.set()
+        logger.info(f"Modelo listo: {self.startup}")
+        if self.on_ready:
+            self.on_ready()
+
+    def wait_ready(self, timeout=None):
+        """
+        Espera a que el modelo esté cargado y calentado; False si se vence el timeout y
+        RuntimeError (con el error original como causa) si la carga falló
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self.ready.wait(0.05):
+            if self.failed.is_set():
+                raise RuntimeError("No se pudo cargar el modelo de visión") from self.load_error
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+        return True
+
+    def startup_stats(self):
+        """
+        Segundos de import del backend, carga, calentamiento y total hasta estar listo
+        """
+        return dict(self.startup)
+
+    def _count(self, agent_id, counter):
+        with self.counters_lock:
+            self.counters[agent_id][counter] += 1
+
+    def frame_stats(self):
+        """
+        Contadores por agente: recibidos, descartados por llegar otro más nuevo,
+        decodificados e inferidos
+        """
+        with self.counters_lock:
+            return {agent_id: dict(counts) for agent_id, counts in self.counters.items()}
+
+    def transport_stats(self):
+        """
+        Por agente: fragmentos, frames completos y perdidos, bytes y latencia de transporte
+        """
+        return {agent_id: r.stats() for agent_id, r in self.reassemblers.items()}
+
+    def motion_stats(self):
+        """
+        Por agente: frames, keyframes (inferencias reales), reutilizados, propagados,
+        fracción de inferencias ahorradas y deriva medida en los keyframes
+        """
+        return {agent_id: gate.stats() for agent_id, gate in self.gates.items()}
+
+    def socket_stats(self):
+        """
+        Datagramas leídos, truncados (más grandes que el buffer) y de agentes ajenos
+        """
+        return dict(self.socket_counters)
+
+    def inference_stats(self):
+        return self.batcher.stats() if self.batcher else {}
+
+    def _stop_pipeline(self):
+        self.running = False
+        for stage in self.stages.values():
+            stage.stop()
+        if self.batcher:
+            self.batcher.stop()
+
+    def metrics(self):
+        """
+        Instantánea de métricas: histogramas de latencia por etapa (handle por datagrama;
+        decode, resize, infer, annotate y display por frame; model por lote), contadores
+        y fps por agente, colas de las etapas y sockets
+        """
+        latency = {'handle': self.handle_latency.snapshot()}
+        latency.update((name, stage.latency.snapshot()) for name, stage in self.stages.items())
+        latency['model'] = (self.batcher.forward if self.batcher else Histogram()).snapshot()
+        latency['display'] = self.display_latency.snapshot()
+        transport = self.transport_stats()
+        agents = self.frame_stats()
+        for agent_id, agent in agents.items():
+            agent['lost'] = transport[agent_id]['lost_frames']
+            agent['fps'] = self.rates[agent_id].rate()
+        return {
+            'ready': self.ready.is_set(),
+            'failed': self.failed.is_set(),
+            'latency': latency,
+            'agents': agents,
+            'stages': self.pipeline_stats(),
+            'sockets': self.socket_stats(),
+        }
+
+    def pipeline_stats(self):
+        """
+        Por etapa: hilos, profundidad de cola, procesados, descartados y ms medios por elemento
+        """
+        return {name: stage.stats() for name, stage in self.stages.items()}
+
+    def latest_detections(self):
+        """
+        Últimas detecciones por agente (arreglos DETECTION_DTYPE)
+        """
+        return {agent_id: self.table.read(agent_id) for agent_id in self.agent_ids}
+
+    def draw_detections(self, frame, detections):
+        """
+        Dibuja sobre el frame las detecciones ya filtradas (arreglo DETECTION_DTYPE)
+        """
+        names = self.model.names
+        for x1, y1, x2, y2, conf, cls in detections.tolist():
+            label = f"{names[cls]} {conf:.2f}"
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, label, (x1, y1-10),
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        return frame
+
     def start_receiving(self):
+        self.start_workers()
+        
+        if self.stream_port is not None:
+            self.stream = VisionStreamServer(self.ring, self.stream_port, self.stream_host,
+                                             histogram=self.display_latency).start()
+        try:
+            if self.headless or self.stream is not None:
+                while self.running:
+                    time.sleep(0.1)
+            else:
+                self._display_streams()
+        except KeyboardInterrupt:
+            logger.info("Interrumpido, deteniendo...")
+        finally:
+            # Siempre se libera la memoria compartida del anillo y la tabla
+            self.stop()
+        
+    def start_workers(self):
+        """
+        Arranca las etapas del pipeline y el hilo receptor, sin ventana
+        """
         logger.info("Iniciando recepción de streams")
         
-        for i in range(self.num_agents):
-            receiver = threading.Thread(
-                target=self._receive_stream, 
-                args=(i,),
-                name=f"Receiver-{i}"
-            )
-            receiver.daemon = True
-            receiver.start()
-            logger.debug(f"Hilo receptor {i} iniciado")
+        for stage in self.stages.values():
+            stage.start()
+        if self.metrics_port is not None:
+            self.metrics_server = MetricsServer(self.metrics, self.metrics_port, self.metrics_host).start()
         
-        self._display_streams()
+        receiver = threading.Thread(target=self._receive_loop, name="Receiver", daemon=True)
+        receiver.start()
         
-    def _receive_stream(self, agent_id):
-        port = self.base_port + agent_id
-        logger.info(f"Iniciando recepción en puerto {port} para agente {agent_id}")
+    def _open_sockets(self, selector):
+        if self.shared_port is not None:
+            ports = [(self.shared_port, None)]
+        else:
+            ports = [(self.base_port + agent_id, agent_id) for agent_id in self.agent_ids]
         
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        try:
-            sock.bind(('0.0.0.0', port))
-            sock.settimeout(1.0)
-        except Exception as e:
-            logger.error(f"Error al configurar socket para agente {agent_id}: {e}")
-            return
-            
-        while self.running:
+        sockets = []
+        for port, agent_id in ports:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             try:
-                data, addr = sock.recvfrom(65535)
-                logger.debug(f"Datos recibidos de {addr} para agente {agent_id}, tamaño: {len(data)} bytes")
-                
-                if len(data) < 4:
-                    logger.warning(f"Datos recibidos muy cortos: {len(data)} bytes")
-                    continue
-                
-                received_agent_id = struct.unpack('i', data[:4])[0]
-                if received_agent_id != agent_id:
-                    logger.warning(f"ID de agente no coincide: esperado {agent_id}, recibido {received_agent_id}")
-                    continue
-                
-                img_data = data[4:]
-                nparr = np.frombuffer(img_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if frame is None:
-                    logger.warning("Usando frame de prueba debido a error de decodificación")
-                    frame = np.ones((240, 320, 3), dtype=np.uint8) * 128
-                    cv2.putText(frame, f"Agent {agent_id} - No Data", (10, 120),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
-                else:
-                    # Redimensionar si es necesario
-                    frame = cv2.resize(frame, (320, 240))
-                    # Procesar frame con YOLO
-                    frame = self.process_frame_yolo(frame)
-                    
-                # Agregar texto informativo
-                cv2.putText(frame, f"Agent {agent_id}", (10, 30),
-                          cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                
-                with self.lock:
-                    self.frame_buffer[agent_id] = frame.copy()
-                    
-            except socket.timeout:
-                continue
+                # Un frame grande llega como ráfaga de fragmentos: buffer de kernel amplio
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+                sock.bind(('0.0.0.0', port))
+                sock.setblocking(False)
             except Exception as e:
-                logger.error(f"Error en recepción para agente {agent_id}: {e}")
+                logger.error(f"Error al configurar socket en puerto {port}: {e}")
+                sock.close()
                 continue
-                
-    def _display_streams(self):
-        logger.info("Iniciando visualización")
-        cv2.namedWindow('Agent Vision Streams', cv2.WINDOW_NORMAL)
+            # data = agente esperado en ese puerto (None en el puerto compartido)
+            selector.register(sock, selectors.EVENT_READ, agent_id)
+            sockets.append(sock)
+            logger.info(f"Recibiendo en puerto {port} para agente {'*' if agent_id is None else agent_id}")
+        return sockets
         
-        while self.running:
-            try:
-                with self.lock:
-                    current_frames = self.frame_buffer.copy()
-                
-                if current_frames:
-                    rows = (self.num_agents + 2) // 3
-                    cols = min(3, self.num_agents)
-                    cell_height = 240
-                    cell_width = 320
-                    
-                    grid = np.zeros((cell_height * rows, cell_width * cols, 3), 
-                                  dtype=np.uint8)
-                    
-                    for agent_id, frame in current_frames.items():
-                        i = agent_id // cols
-                        j = agent_id % cols
+    def _receive_loop(self):
+        """
+        Un solo hilo atiende todos los sockets con selectors. Cada socket se vacía con
+        recvmsg_into (recv_into en Windows) sobre un buffer preasignado; aquí solo se
+        separa por agente y se rearman fragmentos, el trabajo pesado queda en el pipeline.
+        """
+        selector = selectors.DefaultSelector()
+        sockets = self._open_sockets(selector)
+        buffer = bytearray(65536)
+        view = memoryview(buffer)
+        has_recvmsg = hasattr(socket.socket, 'recvmsg_into')
+        truncated_flag = getattr(socket, 'MSG_TRUNC', 0)
+        last_expire = time.perf_counter()
+        
+        try:
+            while self.running:
+                for key, _ in selector.select(timeout=0.5):
+                    sock, expected = key.fileobj, key.data
+                    # Vaciar el socket con un tope para no dejar esperando a los demás
+                    for _ in range(64):
+                        try:
+                            if has_recvmsg:
+                                size, _, flags, _ = sock.recvmsg_into([buffer])
+                            else:
+                                size, flags = sock.recv_into(buffer), 0
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        except OSError as e:
+                            # Windows avisa con un error los datagramas más grandes que el buffer
+                            logger.error(f"Error en recepción: {e}")
+                            break
+                        self.socket_counters['datagrams'] += 1
+                        if flags & truncated_flag:
+                            self.socket_counters['truncated'] += 1
+                            continue
+                        started = time.perf_counter()
                         try:
-                            grid[i*cell_height:(i+1)*cell_height, 
-                                 j*cell_width:(j+1)*cell_width] = frame
+                            self._handle_datagram(view[:size], expected)
                         except Exception as e:
-                            logger.error(f"Error al colocar frame en grid: {e}")
-                    
-                    cv2.imshow('Agent Vision Streams', grid)
+                            logger.error(f"Error procesando datagrama: {e}")
+                        self.handle_latency.observe(time.perf_counter() - started)
                 
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q'):
-                    logger.info("Tecla 'q' presionada, deteniendo...")
-                    self.stop()
-                    break
+                now = time.perf_counter()
+                if now - last_expire > 0.25:
+                    for reassembler in self.reassemblers.values():
+                        reassembler.expire(now)
+                    last_expire = now
+        finally:
+            selector.close()
+            for sock in sockets:
+                sock.close()
                 
-                time.sleep(0.01)
+    def _handle_datagram(self, data, expected):
+        if len(data) < 4:
+            logger.warning(f"Datos recibidos muy cortos: {len(data)} bytes")
+            return
+        chunked = is_chunked(data)
+        agent_id = chunk_agent_id(data) if chunked else struct.unpack_from('i', data)[0]
+        
+        if expected is not None and agent_id != expected:
+            logger.warning(f"ID de agente no coincide: esperado {expected}, recibido {agent_id}")
+            return
+        if agent_id not in self.reassemblers:
+            self.socket_counters['unknown_agent'] += 1
+            return
+        
+        if chunked:
+            frame = self.reassemblers[agent_id].add(data)
+            if frame is None:
+                return
+            img_data = frame.payload
+        else:
+            # Formato anterior: agent_id int32 + JPEG completo en un datagrama
+            img_data = bytes(data[4:])
+        
+        # El receptor solo deja el frame en el buzón; si el anterior no se
+        # alcanzó a procesar se descarta en vez de acumular retraso. El agente
+        # se encola para decodificar una sola vez mientras tenga frame pendiente.
+        self._count(agent_id, 'received')
+        self.arrivals[agent_id] += 1
+        if self.pending[agent_id].put((self.arrivals[agent_id], img_data)):
+            self._count(agent_id, 'dropped')
+        else:
+            self.stages['decode'].put((agent_id,))
                 
-            except Exception as e:
-                logger.error(f"Error en visualización: {e}")
-                continue
+    def _decode(self, item):
+        agent_id = item[0]
+        taken = self.pending[agent_id].take(timeout=0)
+        if taken is None:
+            return None
+        seq, img_data = taken
+        frame = cv2.imdecode(np.frombuffer(img_data, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            logger.warning("Usando frame de prueba debido a error de decodificación")
+            frame = np.ones((240, 320, 3), dtype=np.uint8) * 128
+            cv2.putText(frame, f"Agent {agent_id} - No Data", (10, 120),
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+            # Sin datos no hay nada que inferir: directo a la etapa final
+            self.stages['annotate'].put((agent_id, seq, frame, None))
+            return None
+        self._count(agent_id, 'decoded')
+        return agent_id, seq, frame
+
+    def _resize(self, item):
+        agent_id, seq, frame = item
+        return agent_id, seq, cv2.resize(frame, (320, 240))
+
+    def _infer(self, item):
+        agent_id, seq, frame = item
+        # Un frame por agente a la vez y en orden de llegada: MotionGate compara contra el
+        # frame anterior, y un frame que quedó atrás de uno más nuevo ya no sirve
+        with self.infer_locks[agent_id]:
+            if seq <= self.inferred_seq[agent_id]:
+                self._count(agent_id, 'dropped')
+                return None
+            self.inferred_seq[agent_id] = seq
+            gate = self.gates.get(agent_id)
+            if gate is not None:
+                action, detections, signature = gate.decide(frame)
+                if action != 'detect':
+                    return agent_id, seq, frame, detections
+            detections = to_detections(self.batcher.infer(agent_id, frame), self.conf_threshold)
+            if gate is not None:
+                gate.keyframe(signature, detections)
+        self._count(agent_id, 'inferred')
+        return agent_id, seq, frame, detections
+
+    def _annotate(self, item):
+        agent_id, seq, frame, detections = item
+        # Se dibuja directamente sobre el slot del anillo; con varios hilos de anotación
+        # el lock evita que dos escriban el mismo slot y que uno viejo pise al más nuevo
+        with self.lock:
+            if seq <= self.published_seq[agent_id]:
+                self._count(agent_id, 'dropped')
+                return None
+            self.published_seq[agent_id] = seq
+            slot = self.ring.next_slot(agent_id)
+            np.copyto(slot, frame)
+            if not self.headless:
+                if detections is not None:
+                    self.draw_detections(slot, detections)
+                # Agregar texto informativo
+                cv2.putText(slot, f"Agent {agent_id}", (10, 30),
+                          cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            self.ring.publish(agent_id)
+            if detections is not None:
+                self.table.write(agent_id, detections)
+        self._count(agent_id, 'published')
+        self.rates[agent_id].mark()
+        return None
+                
+    def _display_streams(self):
+        display_streams(self.ring, lambda: self.running, self.stop, histogram=self.display_latency)
             
     def stop(self):
+        # Lo pueden llamar la tecla 'q', el finally de start_receiving y quien lo arrancó
+        with self.stop_lock:
+            if self.stopped:
+                return
+            self.stopped = True
         logger.info("Deteniendo AgentVisionReceiver")
         self.running = False
-        cv2.destroyAllWindows()
+        self._stop_pipeline()
+        logger.info(f"Arranque: {self.startup_stats()}")
+        logger.info(f"Estadísticas de inferencia: {self.inference_stats()}")
+        logger.info(f"Etapas del pipeline: {self.pipeline_stats()}")
+        logger.info(f"Frames por agente: {self.frame_stats()}")
+        logger.info(f"Transporte por agente: {self.transport_stats()}")
+        logger.info(f"Sockets: {self.socket_stats()}")
+        logger.info(f"Inferencias evitadas por movimiento: {self.motion_stats()}")
+        logger.info(f"Latencias p50/p95 ms: {latency_summary(self.metrics()['latency'])}")
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.stream is not None:
+            self.stream.stop()
+            logger.info(f"Streams MJPEG: {self.stream.stats()}")
+        elif not self.headless:
+            cv2.destroyAllWindows()
+        self.ring.close()
+        self.table.close()
+
+def latency_summary(latency):
+    """{etapa: (p50, p95)} en ms, para el log"""
+    return {stage: (round(h['p50_ms'], 2), round(h['p95_ms'], 2)) for stage, h in latency.items()}
+
+def display_streams(ring, is_running, on_quit, fps=30, histogram=None):
+    """
+    Muestra el último frame de cada agente del anillo en una grilla de hasta 3 columnas.
+    Solo redibuja cuando alguna celda cambió y waitKey marca el ritmo (fps). histogram
+    registra lo que tarda cada redibujo.
+    """
+    logger.info("Iniciando visualización")
+    cv2.namedWindow('Agent Vision Streams', cv2.WINDOW_NORMAL)
+    
+    compositor = GridCompositor(ring)
+    delay = max(1, int(1000 / fps))
+    
+    while is_running():
+        try:
+            started = time.perf_counter()
+            if compositor.update():
+                cv2.imshow('Agent Vision Streams', compositor.grid)
+                if histogram is not None:
+                    histogram.observe(time.perf_counter() - started)
+            
+            key = cv2.waitKey(delay) & 0xFF
+            if key == ord('q'):
+                logger.info("Tecla 'q' presionada, deteniendo...")
+                on_quit()
+                break
+            
+        except Exception as e:
+            logger.error(f"Error en visualización: {e}")
+            continue
+
+def _vision_worker(agent_ids, num_agents, ring_name, table_name, options, stop_event, results,
+                   ready_count, failed_count):
+    """
+    Proceso hijo: su propio modelo y pipeline para un subconjunto de agentes, escribiendo
+    frames y detecciones en los segmentos compartidos del padre
+    """
+    def on_ready():
+        with ready_count.get_lock():
+            ready_count.value += 1
+
+    def on_failed():
+        with failed_count.get_lock():
+            failed_count.value += 1
+
+    ring = FrameRing(num_agents, slots=options.pop('ring_slots'), name=ring_name, create=False)
+    table = DetectionTable(num_agents, name=table_name, create=False)
+    receiver = AgentVisionReceiver(num_agents=num_agents, agent_ids=agent_ids,
+                                   ring=ring, table=table, on_ready=on_ready, on_failed=on_failed,
+                                   **options)
+    receiver.start_workers()
+    stop_event.wait()
+    receiver._stop_pipeline()
+    results.put({
+        'agents': agent_ids,
+        'startup': receiver.startup_stats(),
+        'inference': receiver.inference_stats(),
+        'pipeline': receiver.pipeline_stats(),
+        'frames': receiver.frame_stats(),
+        'transport': receiver.transport_stats(),
+        'sockets': receiver.socket_stats(),
+        'motion': receiver.motion_stats(),
+        'latency': latency_summary(receiver.metrics()['latency']),
+    })
+    ring.close()
+    table.close()
+
+class ShardedVisionReceiver:
+    """
+    Reparte los agentes entre varios procesos (cada uno con sus puertos UDP, su modelo y
+    su pipeline) para que el trabajo en Python no quede serializado por el GIL. El padre
+    es dueño del anillo de frames y de la tabla de detecciones y solo muestra la grilla.
+    """
+    def __init__(self, num_agents=5, base_port=5123, processes=None, headless=False,
+                 ring_slots=3, stream_port=None, stream_host='127.0.0.1', metrics_port=None, **options):
+        if options.get('shared_port') is not None:
+            raise ValueError("shared_port no se puede repartir entre procesos; usar un puerto por agente")
+        self.num_agents = num_agents
+        self.processes = min(processes or os.cpu_count() or 1, num_agents)
+        self.headless = headless
+        self.stream_port = stream_port
+        self.stream_host = stream_host
+        self.stream = None
+        self.running = True
+        self.stopped = False
+        self.stop_lock = threading.Lock()
+        self.ring = FrameRing(num_agents, slots=ring_slots)
+        self.table = DetectionTable(num_agents)
+        # spawn: seguro con CUDA y el mismo comportamiento en Windows y Linux
+        context = multiprocessing.get_context('spawn')
+        self.stop_event = context.Event()
+        self.results = context.Queue()
+        # Cuántos procesos ya tienen el modelo cargado y calentado
+        self.ready_count = context.Value('i', 0)
+        # Cuántos procesos no pudieron cargar el modelo
+        self.failed_count = context.Value('i', 0)
+        threads = max(1, (os.cpu_count() or 1) // self.processes)
+        self.workers = []
+        for shard in range(self.processes):
+            agent_ids = list(range(shard, num_agents, self.processes))
+            worker_options = dict(options, base_port=base_port, headless=headless,
+                                  ring_slots=ring_slots, threads=threads)
+            if metrics_port is not None:
+                # Un endpoint por proceso (metrics_port + shard), cada uno con sus agentes
+                worker_options['metrics_port'] = metrics_port + shard
+            self.workers.append(context.Process(
+                target=_vision_worker,
+                args=(agent_ids, num_agents, self.ring.name, self.table.name,
+                      worker_options, self.stop_event, self.results, self.ready_count,
+                      self.failed_count),
+                name=f"Vision-{shard}",
+                daemon=True,
+            ))
+        logger.info(f"Iniciando ShardedVisionReceiver: {num_agents} agentes en {self.processes} procesos")
+
+    def latest_detections(self):
+        return {agent_id: self.table.read(agent_id) for agent_id in range(self.num_agents)}
+
+    def is_ready(self):
+        return self.ready_count.value == self.processes
+
+    def failed(self):
+        """Algún proceso no pudo cargar el modelo o terminó antes de tiempo"""
+        return self.failed_count.value > 0 or any(worker.exitcode is not None for worker in self.workers)
+
+    def wait_ready(self, timeout=None):
+        """
+        Como AgentVisionReceiver.wait_ready: False si se vence el timeout, RuntimeError si
+        algún proceso falló
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self.is_ready():
+            if self.failed():
+                raise RuntimeError("Un proceso de visión no pudo cargar el modelo")
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def start_receiving(self):
+        for worker in self.workers:
+            worker.start()
+        if self.stream_port is not None:
+            self.stream = VisionStreamServer(self.ring, self.stream_port, self.stream_host).start()
+        # Si un proceso no pudo cargar el modelo se deja de mostrar, igual que sin procesos
+        is_running = lambda: self.running and not self.failed()
+        try:
+            if self.headless or self.stream is not None:
+                while is_running():
+                    time.sleep(0.1)
+            else:
+                display_streams(self.ring, is_running, self.stop)
+            if self.failed():
+                logger.error("Un proceso de visión falló; deteniendo")
+        except KeyboardInterrupt:
+            logger.info("Interrumpido, deteniendo...")
+        finally:
+            self.stop()
+
+    def stop(self):
+        # Lo pueden llamar la tecla 'q', el finally de start_receiving y quien lo arrancó
+        with self.stop_lock:
+            if self.stopped:
+                return
+            self.stopped = True
+        logger.info("Deteniendo ShardedVisionReceiver")
+        self.running = False
+        self.stop_event.set()
+        for worker in self.workers:
+            if not worker.is_alive():
+                continue
+            try:
+                logger.info(f"Estadísticas de proceso: {self.results.get(timeout=5)}")
+            except queue.Empty:
+                logger.warning("Un proceso de visión no reportó estadísticas")
+        for worker in self.workers:
+            worker.join(timeout=5)
+        if self.stream is not None:
+            self.stream.stop()
+            logger.info(f"Streams MJPEG: {self.stream.stats()}")
+        elif not self.headless:
+            cv2.destroyAllWindows()
+        self.ring.close()
+        self.table.close()
 
 if __name__ == "__main__":
     logger.info("Iniciando programa principal")
-    receiver = AgentVisionReceiver(num_agents=5)
+    # VISION_PROCESSES > 1 reparte los agentes entre procesos
+    processes = int(os.environ.get('VISION_PROCESSES', '1'))
+    # VISION_STREAM_PORT sirve la grilla como MJPEG (http://127.0.0.1:<puerto>/) sin ventana
+    stream_port = os.environ.get('VISION_STREAM_PORT')
+    stream_port = int(stream_port) if stream_port else None
+    # VISION_METRICS_PORT publica /metrics (Prometheus) y /metrics.json
+    metrics_port = os.environ.get('VISION_METRICS_PORT')
+    metrics_port = int(metrics_port) if metrics_port else None
+    if processes > 1:
+        receiver = ShardedVisionReceiver(num_agents=5, processes=processes, stream_port=stream_port,
+                                         metrics_port=metrics_port)
+    else:
+        receiver = AgentVisionReceiver(num_agents=5, stream_port=stream_port, metrics_port=metrics_port)
     receiver.start_receiving()
\ No newline at end of file
@@ -0,0 +1,134 @@
+import json
+import struct
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is optional; JSON and the packed layout always work
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+PACKED = 'application/x-robot-packed'
+FORMATS = [JSON, MSGPACK, PACKED]
+
+# Packed layout, little endian. A world state is a header, one shared cube snapshot and the
+# agents; RobotWorld2.cs gives every agent the same available_cubes, so it is sent once.
+HEADER = struct.Struct('<4sII')  # magic, agent count, cube count
+CUBE = struct.Struct('<i3f')  # id, x, y, z
+AGENT = struct.Struct('<i3f?d')  # id, x, y, z, has_cube, time
+DECISION = struct.Struct('<Bi3f')  # decision code, cube id (-1 if none), target x, y, z
+METRIC = struct.Struct('<ii4f')  # agent id, cubes delivered, distance, efficiency, rate, minutes
+WORLD_MAGIC = b'RWS1'
+DECISIONS = ['get_cube', 'deliver_cube', 'put_cube', 'explore']
+DECISION_CODES = {name: code for code, name in enumerate(DECISIONS)}
+
+
+class UnsupportedFormat(Exception):
+    pass
+
+
+def _xyz(position):
+    return position['x'], position['y'], position['z']
+
+
+def _position(x, y, z):
+    return {'x': x, 'y': y, 'z': z}
+
+
+def pack_world_state(world_state):
+    entries = world_state['agentStates']
+    cubes = entries[0]['state']['available_cubes'] if entries else []
+    parts = [HEADER.pack(WORLD_MAGIC, len(entries), len(cubes))]
+    parts.extend(CUBE.pack(cube['id'], *_xyz(cube['position'])) for cube in cubes)
+    for entry in entries:
+        state = entry['state']
+        parts.append(AGENT.pack(int(entry['id']), *_xyz(state['position']),
+                                state['has_cube'], state.get('time', 0)))
+    return b''.join(parts)
+
+
+def unpack_world_state(body):
+    if len(body) < HEADER.size:
+        raise UnsupportedFormat("not a packed world state")
+    magic, num_agents, num_cubes = HEADER.unpack_from(body)
+    if magic != WORLD_MAGIC:
+        raise UnsupportedFormat("not a packed world state")
+    offset = HEADER.size
+    cube_bytes = num_cubes * CUBE.size
+    cubes = [{'id': cube_id, 'position': _position(x, y, z), 'is_carried': False}
+             for cube_id, x, y, z in CUBE.iter_unpack(body[offset:offset + cube_bytes])]
+    offset += cube_bytes
+    return {'agentStates': [
+        {'id': str(agent_id),
+         'state': {'position': _position(x, y, z), 'has_cube': has_cube,
+                   'available_cubes': cubes, 'time': t}}
+        for agent_id, x, y, z, has_cube, t
+        in AGENT.iter_unpack(body[offset:offset + num_agents * AGENT.size])
+    ]}
+
+
+def pack_decisions(decisions):
+    parts = []
+    for decision in decisions:
+        cube = decision.get('target_cube')
+        if cube is not None:
+            parts.append(DECISION.pack(DECISION_CODES[decision['decision']], cube['id'], *_xyz(cube['position'])))
+        elif 'target_position' in decision:
+            parts.append(DECISION.pack(DECISION_CODES[decision['decision']], -1, *_xyz(decision['target_position'])))
+        else:
+            parts.append(DECISION.pack(DECISION_CODES[decision['decision']], -1, 0, 0, 0))
+    return b''.join(parts)
+
+
+def unpack_decisions(body):
+    decisions = []
+    for code, cube_id, x, y, z in DECISION.iter_unpack(body):
+        name = DECISIONS[code]
+        if name == 'get_cube':
+            decisions.append({'decision': name, 'target_cube': {'id': cube_id, 'position': _position(x, y, z)}})
+        elif name == 'deliver_cube':
+            decisions.append({'decision': name, 'target_position': _position(x, y, z)})
+        elif name == 'put_cube':
+            decisions.append({'decision': name, 'target': 'delivery_zone'})
+        else:
+            decisions.append({'decision': name})
+    return decisions
+
+
+def pack_metrics(metrics):
+    return b''.join(
+        METRIC.pack(m['agent_id'], m['cubes_delivered'], m['total_distance'], m['efficiency_ratio'],
+                    m['delivery_rate'], m['elapsed_minutes'])
+        for m in metrics
+    )
+
+
+def unpack_metrics(body):
+    keys = ('agent_id', 'cubes_delivered', 'total_distance', 'efficiency_ratio', 'delivery_rate', 'elapsed_minutes')
+    return [dict(zip(keys, row)) for row in METRIC.iter_unpack(body)]
+
+
+def decode(body, mimetype):
+    """Request body -> the same dict request.json would give."""
+    if mimetype == MSGPACK:
+        if msgpack is None:
+            raise UnsupportedFormat("msgpack is not installed")
+        return msgpack.unpackb(body)
+    if mimetype == PACKED:
+        return unpack_world_state(body)
+    return json.loads(body)
+
+
+def encode(payload, mimetype):
+    """A {'decisions': [...]} or {'metrics': [...]} reply in the negotiated format."""
+    if mimetype == MSGPACK:
+        if msgpack is None:
+            raise UnsupportedFormat("msgpack is not installed")
+        return msgpack.packb(payload)
+    if mimetype == PACKED:
+        if 'decisions' in payload:
+            return pack_decisions(payload['decisions'])
+        if 'metrics' in payload:
+            return pack_metrics(payload['metrics'])
+        raise UnsupportedFormat("only decisions and metrics have a packed layout")
+    return json.dumps(payload).encode()
@@ -1,119 +1,367 @@
 import agentpy as ap
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from datetime import datetime
 import logging
 import math
+import os
+import threading
+import time
+from collections import deque
+import copy
+from operator import itemgetter
+import numpy as np
+import Codecs
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('CONTROLLER_LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
+
+class TraceLog:
+    """
+    Per-agent trace events, sampled and kept in a ring buffer. An event costs a tuple append;
+    it is only formatted if DEBUG logging is on or the buffer is dumped.
+    Per-tick events are sampled per (agent, event); state transitions are always kept.
+    """
+    TRANSITIONS = frozenset({'delivered', 'targeting'})
+
+    def __init__(self, capacity=2048, sample_every=10):
+        self.events = deque(maxlen=capacity)
+        self.sample_every = sample_every  # Keep one event in N per agent and event; 0 turns tracing off
+        self.counters = {}
+
+    def configure(self, capacity=None, sample_every=None):
+        if capacity is not None:
+            self.events = deque(self.events, maxlen=capacity)
+        if sample_every is not None:
+            self.sample_every = sample_every
+            self.counters.clear()
+
+    def sampled(self, agent_id, event):
+        if not self.sample_every:
+            return False
+        if event in self.TRANSITIONS:
+            return True
+        key = (agent_id, event)
+        count = self.counters.get(key, 0)
+        self.counters[key] = count + 1
+        return count % self.sample_every == 0
+
+    def record(self, event, agent_id, **fields):
+        self.events.append((time.time(), event, agent_id, fields))
+        logger.debug("%s agent=%s %s", event, agent_id, fields)
+
+    def dump(self, clear=False):
+        events = [{'time': t, 'event': event, 'agent_id': agent_id, **fields}
+                  for t, event, agent_id, fields in self.events]
+        if clear:
+            self.events.clear()
+        return events
+
+
+trace = TraceLog(capacity=int(os.environ.get('CONTROLLER_TRACE_CAPACITY', 2048)),
+                 sample_every=int(os.environ.get('CONTROLLER_TRACE_SAMPLE', 10)))
+
 app = Flask(__name__)
 CORS(app)
 
-class RobotAgent(ap.Agent):
-    def setup(self):
-        self.id = None
+class CubeSnapshot:
+    """One tick's available_cubes list with O(1) lookup by cube id."""
+
+    def __init__(self, cubes):
+        self.cubes = cubes
+        self.order_by_id = {cube['id']: order for order, cube in enumerate(cubes)}
+
+    @staticmethod
+    def snapshot_key(cubes):
+        # Unity builds every agent's list from the same frame, so the ids identify the snapshot
+        return tuple(map(itemgetter('id'), cubes))
+
+    def rebind(self, cubes):
+        bound = copy.copy(self)
+        bound.cubes = cubes
+        return bound
+
+    def find(self, cube_id):
+        order = self.order_by_id.get(cube_id)
+        return None if order is None else self.cubes[order]
+
+
+class CubeIndex(CubeSnapshot):
+    """Uniform x/z grid over one snapshot of available cubes, shared by every agent in a tick."""
+
+    MIN_CUBES = 32  # Below this a linear scan is cheaper than building the grid
+
+    def __init__(self, cubes, cell_size=None):
+        super().__init__(cubes)
+
+        xs = [cube['position']['x'] for cube in cubes]
+        zs = [cube['position']['z'] for cube in cubes]
+        if cell_size is None:
+            area = max(1.0, (max(xs) - min(xs)) * (max(zs) - min(zs)))
+            cell_size = max(1.0, 2 * math.sqrt(area / len(cubes)))
+        self.cell_size = cell_size
+
+        self.cells = {}
+        for order, (x, z) in enumerate(zip(xs, zs)):
+            self.cells.setdefault(self._cell(x, z), []).append(order)
+        self.min_i = min(i for i, _ in self.cells)
+        self.max_i = max(i for i, _ in self.cells)
+        self.min_k = min(k for _, k in self.cells)
+        self.max_k = max(k for _, k in self.cells)
+
+    def _cell(self, x, z):
+        return (math.floor(x / self.cell_size), math.floor(z / self.cell_size))
+
+    def _ring(self, ci, ck, r):
+        if r == 0:
+            yield (ci, ck)
+            return
+        for di in range(-r, r + 1):
+            yield (ci + di, ck - r)
+            yield (ci + di, ck + r)
+        for dk in range(-r + 1, r):
+            yield (ci - r, ck + dk)
+            yield (ci + r, ck + dk)
+
+    def nearest(self, position, distance_fn, threshold):
+        """
+        Same answer as a linear scan with distance_fn: the smallest distance wins and ties go
+        to the cube listed first. Returns (order, distance), or (None, inf) if there are no cubes.
+        """
+        ci, ck = self._cell(position['x'], position['z'])
+        max_r = max(abs(ci - self.min_i), abs(ci - self.max_i),
+                    abs(ck - self.min_k), abs(ck - self.max_k))
+        best_order, best_distance = None, float('inf')
+
+        for r in range(max_r + 1):
+            for cell in self._ring(ci, ck, r):
+                for order in self.cells.get(cell, ()):
+                    distance = distance_fn(position, self.cubes[order]['position'])
+                    if distance < best_distance or (distance == best_distance and order < best_order):
+                        best_order, best_distance = order, distance
+
+            # Cubes outside rings 0..r are at least r cells away on x or z
+            bound = r * self.cell_size
+            if bound < threshold:
+                bound = 0
+            if bound - 1e-9 > best_distance:
+                break
+
+        return best_order, best_distance
+
+
+def positions_array(positions):
+    return np.array([(p['x'], p['y'], p['z']) for p in positions], dtype=np.float64)
+
+
+def distance_matrix(agent_xyz, cube_xyz, threshold):
+    # Same operation order as RobotAgent.calculate_distance so results match bit for bit
+    dx = agent_xyz[:, 0, None] - cube_xyz[None, :, 0]
+    dy = agent_xyz[:, 1, None] - cube_xyz[None, :, 1]
+    dz = agent_xyz[:, 2, None] - cube_xyz[None, :, 2]
+    distances = np.sqrt(dx * dx + dy * dy + dz * dz)
+    distances[distances < threshold] = 0
+    return distances
+
+
+class CubeDistanceMatrix(CubeSnapshot):
+    """Agent x cube distances for one snapshot, computed with NumPy for a whole batch of agents."""
+
+    MAX_CHUNK = 1 << 20  # Cap on agent x cube cells materialized at once
+
+    def __init__(self, cubes, positions, threshold):
+        super().__init__(cubes)
+        cube_xyz = positions_array(map(itemgetter('position'), cubes))
+        agent_xyz = positions_array(positions)
+
+        self.nearest_order = np.empty(len(positions), dtype=np.intp)
+        self.nearest_distance = np.empty(len(positions), dtype=np.float64)
+        rows = max(1, self.MAX_CHUNK // len(cubes))
+        for start in range(0, len(positions), rows):
+            distances = distance_matrix(agent_xyz[start:start + rows], cube_xyz, threshold)
+            orders = distances.argmin(axis=1)
+            self.nearest_order[start:start + rows] = orders
+            self.nearest_distance[start:start + rows] = distances[np.arange(len(orders)), orders]
+        self.row = None
+
+    def for_agent(self, row, cubes):
+        bound = self.rebind(cubes)
+        bound.row = row
+        return bound
+
+    def nearest(self, position, distance_fn, threshold):
+        return int(self.nearest_order[self.row]), float(self.nearest_distance[self.row])
+
+
+class CubeAssignment(CubeSnapshot):
+    """Robot-to-cube matching solved for the whole fleet at once instead of first come, first served."""
+
+    def __init__(self, cubes):
+        super().__init__(cubes)
+        self.assigned = {}  # agent slot -> (cube order, distance)
+        self.slot = None
+
+    def solve(self, slots, positions, claimed, threshold):
+        """
+        Min-cost matching of the agents in slots to cubes outside claimed. Agents left over when
+        there are more agents than free cubes fall back to their nearest cube.
+        """
+        from scipy.optimize import linear_sum_assignment
+
+        cube_xyz = positions_array(map(itemgetter('position'), self.cubes))
+        distances = distance_matrix(positions_array(positions), cube_xyz, threshold)
+        free_orders = np.array([order for order in range(len(self.cubes)) if order not in claimed],
+                               dtype=np.intp)
+
+        unmatched = set(range(len(slots)))
+        if len(free_orders):
+            costs = distances[:, free_orders]
+            # Some optimal matching only uses each agent's k nearest cubes, k = number of agents
+            k = len(slots)
+            if costs.shape[1] > k:
+                columns = np.unique(np.argpartition(costs, k - 1, axis=1)[:, :k])
+                costs, free_orders = costs[:, columns], free_orders[columns]
+            for row, col in zip(*linear_sum_assignment(costs)):
+                self.assigned[slots[row]] = (int(free_orders[col]), float(costs[row, col]))
+                unmatched.discard(row)
+
+        for row in unmatched:
+            order = int(distances[row].argmin())
+            self.assigned[slots[row]] = (order, float(distances[row, order]))
+
+    def for_agent(self, slot, cubes):
+        bound = self.rebind(cubes)
+        bound.slot = slot
+        return bound
+
+    def nearest(self, position, distance_fn, threshold):
+        return self.assigned.get(self.slot, (None, float('inf')))
+
+
+class RobotState:
+    """Per-agent memory between ticks, kept in slots so large fleets stay small."""
+
+    __slots__ = ('has_cube', 'target_cube_id', 'cubes_delivered', 'start_time', 'total_distance_traveled',
+                 'last_position', 'is_delivering', 'last_movement_time', 'last_cube_count',
+                 'current_action', 'target_position')
+
+    def __init__(self):
         self.has_cube = False
         self.target_cube_id = None
-        self.delivery_zone = {'x': 30, 'y': 0, 'z': 0}
         self.cubes_delivered = 0
         self.start_time = datetime.now()
         self.total_distance_traveled = 0
         self.last_position = None
         self.is_delivering = False
         self.last_movement_time = None
-        self.MIN_MOVEMENT_THRESHOLD = 1  # Threshold for meaningful movement
         self.last_cube_count = 0  # For rate calculation
         self.current_action = None  # Nuevo: para mantener la acción actual
         self.target_position = None  # Nuevo: para mantener el objetivo actual
 
 
+class RobotAgent(ap.Agent):
+    delivery_zone = {'x': 30, 'y': 0, 'z': 0}
+    MIN_MOVEMENT_THRESHOLD = 1  # Threshold for meaningful movement
+
+    def setup(self):
+        self.id = None  # Unity robot id, assigned by RobotWorld.get_agent
+        self.state = RobotState()
+
     def calculate_distance(self, pos1, pos2):
-        distance = math.sqrt(
-            (pos1['x'] - pos2['x'])**2 +
-            (pos1['y'] - pos2['y'])**2 +
-            (pos1['z'] - pos2['z'])**2
-        )
+        dx = pos1['x'] - pos2['x']
+        dy = pos1['y'] - pos2['y']
+        dz = pos1['z'] - pos2['z']
+        # Multiply rather than **2: pow() can be off by one ulp, which would split the NumPy engine
+        distance = math.sqrt(dx * dx + dy * dy + dz * dz)
         return distance if distance >= self.MIN_MOVEMENT_THRESHOLD else 0
 
     def update_metrics(self, current_position, current_time):
-        if self.start_time is None:
-            self.start_time = current_time
+        state = self.state
+        if state.start_time is None:
+            state.start_time = current_time
 
-        if self.last_position and self.last_movement_time:
+        if state.last_position and state.last_movement_time:
             if isinstance(current_time, datetime):
-                time_diff = (current_time - self.last_movement_time).total_seconds()
+                time_diff = (current_time - state.last_movement_time).total_seconds()
             else:  # Assume float (timestamp)
-                time_diff = current_time - self.last_movement_time
+                time_diff = current_time - state.last_movement_time
 
             if time_diff >= 0.1:  # At least 100ms between updates
-                distance = self.calculate_distance(current_position, self.last_position)
+                distance = self.calculate_distance(current_position, state.last_position)
                 if distance > 0:
-                    self.total_distance_traveled += distance
-                    logger.debug(f"Agent {self.id} traveled {distance} units.")
-                self.last_movement_time = current_time
+                    state.total_distance_traveled += distance
+                    if trace.sampled(self.id, "moved"):
+                        trace.record("moved", self.id, distance=distance)
+                state.last_movement_time = current_time
         else:
-            self.last_movement_time = current_time
+            state.last_movement_time = current_time
 
-        self.last_position = current_position.copy()
+        state.last_position = current_position.copy()
 
     def get_utility_metrics(self, current_time):
-        if self.start_time is None:
-            self.start_time = current_time
+        state = self.state
+        if state.start_time is None:
+            state.start_time = current_time
 
         if isinstance(current_time, datetime):
-            elapsed_time = (current_time - self.start_time).total_seconds()
-            logger.debug(f"Elapsed time: {elapsed_time}, current_time: {current_time}, start_time: {self.start_time}")
+            elapsed_time = (current_time - state.start_time).total_seconds()
         else:  # Assume float (timestamp)
-            startTime = self.start_time.timestamp() if isinstance(self.start_time, datetime) else self.start_time
-
-
+            startTime = state.start_time.timestamp() if isinstance(state.start_time, datetime) else state.start_time
             elapsed_time = current_time - startTime
-            logger.debug(f"float Elapsed time: {elapsed_time}, current_time: {current_time}, start_time: {self.start_time}")
-
 
         minutes_elapsed = elapsed_time / 60
-        rate = (self.cubes_delivered) / (minutes_elapsed or 1)
-        self.last_cube_count = self.cubes_delivered
-        logger.debug(f"Agent {self.id} metrics: {self.cubes_delivered} cubes delivered in {minutes_elapsed} minutes. Rate: {rate}, cubecount: {self.last_cube_count}")
+        rate = (state.cubes_delivered) / (minutes_elapsed or 1)
+        state.last_cube_count = state.cubes_delivered
+        if trace.sampled(self.id, "metrics"):
+            trace.record("metrics", self.id, cubes_delivered=state.cubes_delivered,
+                         minutes_elapsed=minutes_elapsed, rate=rate, current_time=current_time)
 
         return {
             'agent_id': self.id,
-            'cubes_delivered': self.cubes_delivered,
-            'total_distance': round(self.total_distance_traveled, 2),
-            'efficiency_ratio': round(self.cubes_delivered / max(1, self.total_distance_traveled) * 10000, 2),
+            'cubes_delivered': state.cubes_delivered,
+            'total_distance': round(state.total_distance_traveled, 2),
+            'efficiency_ratio': round(state.cubes_delivered / max(1, state.total_distance_traveled) * 10000, 2),
             'delivery_rate': round(rate, 2),
             'elapsed_minutes': round(minutes_elapsed, 2),
         }
 
-    def find_nearest_cube(self, position, available_cubes):
+    def find_nearest_cube(self, position, available_cubes, cube_index=None):
+        state = self.state
         if not available_cubes:
             return None
 
         nearest_cube = None
         min_distance = float('inf')
 
-        for cube in available_cubes:
-            if hasattr(cube, 'targeted_by') and cube.get('targeted_by') != self.id:
-                continue
+        if cube_index is not None:
+            order, min_distance = cube_index.nearest(position, self.calculate_distance,
+                                                     self.MIN_MOVEMENT_THRESHOLD)
+            if order is not None:
+                nearest_cube = available_cubes[order]
+        else:
+            for cube in available_cubes:
+                if hasattr(cube, 'targeted_by') and cube.get('targeted_by') != self.id:
+                    continue
 
-            distance = self.calculate_distance(position, cube['position'])
-            if distance < min_distance:
-                min_distance = distance
-                nearest_cube = cube
+                distance = self.calculate_distance(position, cube['position'])
+                if distance < min_distance:
+                    min_distance = distance
+                    nearest_cube = cube
 
         if nearest_cube:
             nearest_cube['targeted_by'] = self.id
-            self.target_cube_id = nearest_cube['id']
-            logger.debug(f"Agent {self.id} targeting cube {nearest_cube['id']} at distance {min_distance}")
-        else:
-            logger.debug(f"Agent {self.id} found no available cubes")
+            state.target_cube_id = nearest_cube['id']
+            if trace.sampled(self.id, "targeting"):
+                trace.record("targeting", self.id, cube=nearest_cube['id'], distance=min_distance)
+        elif trace.sampled(self.id, "no_cubes"):
+            trace.record("no_cubes", self.id)
 
         return nearest_cube
 
-    def step(self, current_state):
+    def step(self, current_state, cube_index=None):
+        state = self.state
         position = current_state['position']
         has_cube = current_state['has_cube']
         available_cubes = current_state['available_cubes']
@@ -121,23 +369,24 @@ class RobotAgent(ap.Agent):
 
         self.update_metrics(position, current_time)
 
-        if has_cube != self.has_cube:
-            self.has_cube = has_cube
-            if not has_cube and self.is_delivering:
-                self.cubes_delivered += 1
-                logger.debug(f"Agent {self.id} completed delivery. Total deliveries: {self.cubes_delivered}")
-                self.is_delivering = False
-                self.current_action = None  # Reset current action
-                self.target_position = None  # Reset target position
+        if has_cube != state.has_cube:
+            state.has_cube = has_cube
+            if not has_cube and state.is_delivering:
+                state.cubes_delivered += 1
+                if trace.sampled(self.id, "delivered"):
+                    trace.record("delivered", self.id, cubes_delivered=state.cubes_delivered)
+                state.is_delivering = False
+                state.current_action = None  # Reset current action
+                state.target_position = None  # Reset target position
             
         # Si ya tenemos una acción en curso y las condiciones no han cambiado, mantenerla
-        if self.current_action and self.target_position:
-            if self.current_action == "get_cube":
+        if state.current_action and state.target_position:
+            if state.current_action == "get_cube":
                 # Verificar si el cubo objetivo aún está disponible
-                target_still_available = any(cube['id'] == self.target_cube_id for cube in available_cubes)
-                if target_still_available and not has_cube:
-                    return {"decision": self.current_action, "target_cube": self.find_cube_by_id(available_cubes, self.target_cube_id)}
-            elif self.current_action == "deliver_cube" and has_cube:
+                target_cube = self.find_cube_by_id(available_cubes, state.target_cube_id, cube_index)
+                if target_cube is not None and not has_cube:
+                    return {"decision": state.current_action, "target_cube": target_cube}
+            elif state.current_action == "deliver_cube" and has_cube:
                 distance_to_delivery = self.calculate_distance(position, self.delivery_zone)
                 if distance_to_delivery > 2:
                     return {"decision": "deliver_cube", "target_position": self.delivery_zone}
@@ -145,31 +394,33 @@ class RobotAgent(ap.Agent):
                     return {"decision": "put_cube", "target": "delivery_zone"}
 
         # Si no hay acción en curso o las condiciones cambiaron, decidir nueva acción
-        self.current_action = None
-        self.target_position = None
+        state.current_action = None
+        state.target_position = None
 
-        if has_cube or (self.target_cube_id is not None and not any(cube['id'] == self.target_cube_id for cube in available_cubes)):
-            self.target_cube_id = None
+        if has_cube or (state.target_cube_id is not None and self.find_cube_by_id(available_cubes, state.target_cube_id, cube_index) is None):
+            state.target_cube_id = None
 
         if not has_cube and available_cubes:
-            target_cube = self.find_nearest_cube(position, available_cubes)
+            target_cube = self.find_nearest_cube(position, available_cubes, cube_index)
             if target_cube:
-                self.current_action = "get_cube"
-                self.target_position = target_cube['position']
+                state.current_action = "get_cube"
+                state.target_position = target_cube['position']
                 return {"decision": "get_cube", "target_cube": target_cube}
         elif has_cube:
             distance_to_delivery = self.calculate_distance(position, self.delivery_zone)
             if distance_to_delivery > 2:
-                self.current_action = "deliver_cube"
-                self.target_position = self.delivery_zone
-                self.is_delivering = True
+                state.current_action = "deliver_cube"
+                state.target_position = self.delivery_zone
+                state.is_delivering = True
                 return {"decision": "deliver_cube", "target_position": self.delivery_zone}
             else:
                 return {"decision": "put_cube", "target": "delivery_zone"}
 
         return {"decision": "explore"}
 
-    def find_cube_by_id(self, available_cubes, cube_id):
+    def find_cube_by_id(self, available_cubes, cube_id, cube_index=None):
+        if cube_index is not None:
+            return cube_index.find(cube_id)
         for cube in available_cubes:
             if cube['id'] == cube_id:
                 return cube
@@ -179,59 +430,330 @@ class RobotAgent(ap.Agent):
 class RobotWorld(ap.Model):
     def setup(self):
         self.agents = ap.AgentList(self, self.p.num_robots, RobotAgent)
-        logger.info(f"Created model with {self.p.num_robots} agents")
+        self.agents_by_id = {}  # Unity id (as sent, a string) -> agent, stable across ticks
+        self.unassigned = list(reversed(self.agents))  # Pre-built agents not yet bound to an id
+        self.assigned_cube_ids = set()  # Cube ids seen at the last global assignment
+        logger.info("Created model with %s agents", self.p.num_robots)
+
+    def get_agent(self, agent_id):
+        agent = self.agents_by_id.get(agent_id)
+        if agent is None:
+            if self.unassigned:
+                agent = self.unassigned.pop()
+            else:
+                agent = RobotAgent(self)
+                self.agents.append(agent)
+            agent.id = int(agent_id)
+            self.agents_by_id[agent_id] = agent
+        return agent
 
     def get_decisions(self, world_state):
         decisions = []
-        agent_states = {entry['id']: entry['state'] for entry in world_state['agentStates']}
-        while len(self.agents) < len(agent_states):
-            new_agent = RobotAgent(self)
-            self.agents.append(new_agent)
-
-        for i, agent_id in enumerate(agent_states.keys()):
-            self.agents[i].id = int(agent_id)
-
-        for agent in self.agents:
-            if str(agent.id) in agent_states:
-                agent_state = agent_states[str(agent.id)]
-                decisions.append(agent.step(agent_state))
+        # Decisions go back in agentStates order, which is how RobotWorld2.cs applies them
+        active = [(self.get_agent(entry['id']), entry['state']) for entry in world_state['agentStates']]
+        if self.p.get('assignment', 'greedy') == 'global':
+            cube_views = self.get_cube_assignments(active)
+        elif self.p.get('engine', 'agent') == 'numpy':
+            cube_views = self.get_cube_matrices(active)
+        elif self.p.get('spatial_index', True):
+            cube_indexes = {}
+            cube_views = [self.get_cube_index(state['available_cubes'], cube_indexes) for _, state in active]
+        else:
+            cube_views = [None] * len(active)
+
+        for (agent, agent_state), cube_view in zip(active, cube_views):
+            decisions.append(agent.step(agent_state, cube_view))
         return decisions
 
+    def group_searching_agents(self, active):
+        # Only agents that may go looking for a cube need a row in the distance matrix
+        groups = {}
+        keys = {}  # id(list) -> snapshot key, so agents sharing one list (WorldSession) pay once
+        for slot, (agent, state) in enumerate(active):
+            cubes = state['available_cubes']
+            if cubes and not state['has_cube']:
+                key = keys.get(id(cubes))
+                if key is None:
+                    key = keys[id(cubes)] = CubeSnapshot.snapshot_key(cubes)
+                groups.setdefault(key, []).append(slot)
+        return groups
+
+    def get_cube_assignments(self, active):
+        groups = self.group_searching_agents(active)
+        cube_ids = set().union(*groups)
+        changed = len(cube_ids ^ self.assigned_cube_ids)
+        # Past this many added/removed cubes every target is up for grabs again
+        full_resolve = changed > self.p.get('resolve_fraction', 0.2) * max(1, len(cube_ids))
+        self.assigned_cube_ids = cube_ids
+
+        cube_views = [None] * len(active)
+        for slots in groups.values():
+            first_agent, first_state = active[slots[0]]
+            assignment = CubeAssignment(first_state['available_cubes'])
+
+            # Incremental mode: agents already heading for a still-free cube keep it
+            claimed, free_slots = set(), []
+            for slot in slots:
+                state = active[slot][0].state
+                order = assignment.order_by_id.get(state.target_cube_id)
+                if (not full_resolve and state.current_action == "get_cube"
+                        and order is not None and order not in claimed):
+                    claimed.add(order)
+                else:
+                    state.current_action = None
+                    state.target_position = None
+                    free_slots.append(slot)
+
+            if free_slots:
+                assignment.solve(free_slots, [active[slot][1]['position'] for slot in free_slots],
+                                 claimed, first_agent.MIN_MOVEMENT_THRESHOLD)
+            for slot in slots:
+                cube_views[slot] = assignment.for_agent(slot, active[slot][1]['available_cubes'])
+        return cube_views
+
+    def get_cube_matrices(self, active):
+        groups = self.group_searching_agents(active)
+        cube_views = [None] * len(active)
+        for slots in groups.values():
+            first_agent, first_state = active[slots[0]]
+            matrix = CubeDistanceMatrix(first_state['available_cubes'],
+                                        [active[slot][1]['position'] for slot in slots],
+                                        first_agent.MIN_MOVEMENT_THRESHOLD)
+            for row, slot in enumerate(slots):
+                cube_views[slot] = matrix.for_agent(row, active[slot][1]['available_cubes'])
+        return cube_views
+
+    def get_cube_index(self, available_cubes, cube_indexes):
+        if len(available_cubes) < CubeIndex.MIN_CUBES:
+            return None
+        # cube_indexes is keyed both by list identity (agents sharing one list object, as
+        # WorldSession sends them) and by snapshot key (equal lists parsed from JSON)
+        cube_index = cube_indexes.get(id(available_cubes))
+        if cube_index is not None:
+            return cube_index
+        key = CubeIndex.snapshot_key(available_cubes)
+        cube_index = cube_indexes.get(key)
+        if cube_index is None:
+            cube_index = cube_indexes[key] = CubeIndex(available_cubes)
+        else:
+            # Same snapshot as another agent: reuse its grid but hand back this agent's own dicts
+            cube_index = cube_index.rebind(available_cubes)
+        cube_indexes[id(available_cubes)] = cube_index
+        return cube_index
+
     def get_metrics(self, world_state):
         metrics = []
-        agent_states = {entry['id']: entry['state'] for entry in world_state['agentStates']}
-        for agent in self.agents:
-            if str(agent.id) in agent_states:
-                agent_state = agent_states[str(agent.id)]
+        for entry in world_state['agentStates']:
+            agent = self.agents_by_id.get(entry['id'])
+            if agent is not None:
+                agent_state = entry['state']
                 agent.update_metrics(agent_state['position'], agent_state.get('time', 0))
                 metrics.append(agent.get_utility_metrics(agent_state.get('time', 0)))
-        logger.debug(f"Metrics: {metrics}")
+        logger.debug("Metrics: %s", metrics)
         return metrics
 
 
+class InvalidDelta(ValueError):
+    """A session delta that cannot be applied; the session is left unchanged."""
+
+
+class WorldSession:
+    """
+    Server-side copy of the world for clients that send deltas instead of full snapshots.
+    The cube set lives here; every agent state points at the same available_cubes list.
+    The session has its own RobotWorld, so stateless /get_decisions clients never touch
+    its per-agent state.
+    """
+
+    def __init__(self, num_robots=5, params=None):
+        self.model = RobotWorld({'num_robots': num_robots, **(params or {})})
+        self.model.sim_setup()
+        self.version = 0
+        self.agent_states = {}  # Unity id -> state without available_cubes, in agentStates order
+        self.cubes = {}  # Cube id -> cube, in snapshot order with additions at the end
+        self.cube_list = []
+
+    def _refresh_cubes(self):
+        # A new list on every change, so no tick ever sees a half-updated one
+        self.cube_list = list(self.cubes.values())
+
+    def load_snapshot(self, world_state):
+        """Reset from a full /get_decisions payload; a top-level available_cubes is also accepted."""
+        self.agent_states = {}
+        self.cubes = {cube['id']: cube for cube in world_state.get('available_cubes', ())}
+        for entry in world_state['agentStates']:
+            state = dict(entry['state'])
+            for cube in state.pop('available_cubes', ()):
+                self.cubes.setdefault(cube['id'], cube)
+            self.agent_states[entry['id']] = state
+        self._refresh_cubes()
+        self.version += 1
+
+    # What a delta has to send for an agent the session does not know yet
+    NEW_AGENT_FIELDS = ('position', 'has_cube')
+
+    def validate_delta(self, delta):
+        """Raise InvalidDelta unless the whole delta can be applied."""
+        if not isinstance(delta, dict):
+            raise InvalidDelta("delta must be an object")
+        for cube in delta.get('cubes_added', ()):
+            if 'id' not in cube or 'position' not in cube:
+                raise InvalidDelta("every cube in cubes_added needs 'id' and 'position'")
+        removed = set(delta.get('agents_removed', ()))
+        for entry in delta.get('agents', ()):
+            if 'id' not in entry or not isinstance(entry.get('state'), dict):
+                raise InvalidDelta("every entry in agents needs 'id' and a 'state' object")
+            if entry['id'] in self.agent_states and entry['id'] not in removed:
+                continue
+            missing = [field for field in self.NEW_AGENT_FIELDS if field not in entry['state']]
+            if missing:
+                raise InvalidDelta(f"new agent {entry['id']!r} is missing {', '.join(missing)}")
+
+    def apply_delta(self, delta):
+        """
+        delta holds only what changed: 'agents' (id plus changed state fields), 'agents_removed',
+        'cubes_added' (new or moved cubes) and 'cubes_removed' (ids). New agents send their full
+        state. The delta is validated first, so a rejected one leaves state and version as they were.
+        """
+        self.validate_delta(delta)
+        cubes_changed = False
+        for cube_id in delta.get('cubes_removed', ()):
+            cubes_changed |= self.cubes.pop(cube_id, None) is not None
+        for cube in delta.get('cubes_added', ()):
+            self.cubes[cube['id']] = cube
+            cubes_changed = True
+        if cubes_changed:
+            self._refresh_cubes()
+
+        for agent_id in delta.get('agents_removed', ()):
+            self.agent_states.pop(agent_id, None)
+        for entry in delta.get('agents', ()):
+            self.agent_states.setdefault(entry['id'], {}).update(entry['state'])
+        self.version += 1
+
+    def world_state(self):
+        # One list of fresh cube dicts per tick: RobotAgent marks cubes with targeted_by,
+        # and that must not leak into the stored cubes and from there into the next tick
+        cubes = [dict(cube) for cube in self.cube_list]
+        return {'agentStates': [
+            {'id': agent_id, 'state': {**state, 'available_cubes': cubes}}
+            for agent_id, state in self.agent_states.items()
+        ]}
+
+
+def compact_decision(decision):
+    # Session replies carry only what RobotWorld2.cs reads from a target cube
+    cube = decision.get('target_cube')
+    if cube is None:
+        return decision
+    return {**decision, 'target_cube': {'id': cube['id'], 'position': cube['position']}}
+
+
 # Flask App and Endpoints
 model = RobotWorld({'num_robots': 5})
 model.sim_setup()
+session = WorldSession()
+# RobotWorld and WorldSession are not thread safe; every server mode goes through this lock.
+# The session keeps its own RobotWorld, separate from the one stateless clients use.
+model_lock = threading.Lock()
+
+def read_payload():
+    """Request body in whichever format the client declared in Content-Type."""
+    if request.mimetype in (Codecs.MSGPACK, Codecs.PACKED):
+        return Codecs.decode(request.get_data(), request.mimetype)
+    return request.json
+
+def reply(payload, headers=None):
+    """Response in the best format the client lists in Accept; JSON if it says nothing."""
+    mimetype = request.accept_mimetypes.best_match(Codecs.FORMATS, default=Codecs.JSON)
+    if mimetype == Codecs.JSON:
+        response = jsonify(payload)
+    else:
+        response = Response(Codecs.encode(payload, mimetype), mimetype=mimetype)
+    response.headers.update(headers or {})
+    return response
 
 @app.route('/get_decisions', methods=['POST'])
 def get_decisions():
     try:
-        world_state = request.json
-        decisions = model.get_decisions(world_state)
-        return jsonify({'decisions': decisions})
+        world_state = read_payload()
+        with model_lock:
+            decisions = model.get_decisions(world_state)
+        return reply({'decisions': decisions})
+    except Codecs.UnsupportedFormat as e:
+        return jsonify({'error': str(e)}), 415
     except Exception as e:
-        logger.error(f"Error processing decisions request: {str(e)}")
+        logger.error("Error processing decisions request: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/get_metrics', methods=['POST'])
 def get_metrics():
     try:
-        world_state = request.json
-        metrics = model.get_metrics(world_state)
-        return jsonify({'metrics': metrics})
+        world_state = read_payload()
+        with model_lock:
+            metrics = model.get_metrics(world_state)
+        return reply({'metrics': metrics})
+    except Codecs.UnsupportedFormat as e:
+        return jsonify({'error': str(e)}), 415
+    except Exception as e:
+        logger.error("Error processing metrics request: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+# Session replies also carry the version in a header, since the packed layout has no room for it
+@app.route('/session/snapshot', methods=['POST'])
+def session_snapshot():
+    try:
+        world_state = read_payload()
+        with model_lock:
+            session.load_snapshot(world_state)
+            decisions = session.model.get_decisions(session.world_state())
+        return reply({'version': session.version, 'decisions': [compact_decision(d) for d in decisions]},
+                     {'X-Session-Version': str(session.version)})
+    except Codecs.UnsupportedFormat as e:
+        return jsonify({'error': str(e)}), 415
     except Exception as e:
-        logger.error(f"Error processing metrics request: {str(e)}")
+        logger.error("Error processing session snapshot: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/session/delta', methods=['POST'])
+def session_delta():
+    try:
+        if request.mimetype == Codecs.PACKED:
+            raise Codecs.UnsupportedFormat("deltas have no packed layout, use JSON or msgpack")
+        delta = read_payload()
+        with model_lock:
+            if delta.get('version', session.version) != session.version:
+                # The client missed an update; it has to resync with /session/snapshot
+                return jsonify({'error': 'session out of date, send a snapshot', 'version': session.version}), 409
+            session.apply_delta(delta)
+            decisions = session.model.get_decisions(session.world_state())
+        return reply({'version': session.version, 'decisions': [compact_decision(d) for d in decisions]},
+                     {'X-Session-Version': str(session.version)})
+    except Codecs.UnsupportedFormat as e:
+        return jsonify({'error': str(e)}), 415
+    except InvalidDelta as e:
+        return jsonify({'error': str(e), 'version': session.version}), 400
+    except Exception as e:
+        logger.error("Error processing session delta: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/session/metrics', methods=['GET'])
+def session_metrics():
+    try:
+        with model_lock:
+            metrics = session.model.get_metrics(session.world_state())
+        return reply({'metrics': metrics})
+    except Codecs.UnsupportedFormat as e:
+        return jsonify({'error': str(e)}), 415
+    except Exception as e:
+        logger.error("Error processing session metrics: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/debug/trace', methods=['GET'])
+def get_trace():
+    clear = request.args.get('clear', '').lower() in ('1', 'true')
+    return jsonify({'events': trace.dump(clear=clear)})
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server; see ControllerASGI.py for the production serving mode
+    app.run(debug=os.environ.get('CONTROLLER_DEBUG', '1') == '1')
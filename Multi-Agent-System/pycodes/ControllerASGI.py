@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_options_header
+
+import Codecs
+import Controller2
+
+logger = logging.getLogger(__name__)
+
+# Production serving mode for the Controller2 endpoints (decisions, metrics, the
+# /session/* delta protocol and /debug/trace):
+#
+#     uvicorn ControllerASGI:app --port 5000
+#
+# RobotWorld is stateful, so run a single process; concurrency comes from the worker model.
+
+
+class ModelRunner:
+    """
+    How requests reach the one shared RobotWorld, chosen with CONTROLLER_WORKER_MODEL:
+    actor  - one thread owns the model and handles requests in arrival order (default)
+    lock   - a pool of CONTROLLER_THREADS threads decode and encode in parallel and take
+             Controller2.model_lock only around the model call
+    inline - everything runs on the event loop; least overhead, but the loop blocks meanwhile
+    """
+
+    MODES = ('actor', 'lock', 'inline')
+
+    def __init__(self, mode='actor', threads=4):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown worker model {mode!r}, expected one of {self.MODES}")
+        self.mode = mode
+        self.executor = None
+        if mode != 'inline':
+            self.executor = ThreadPoolExecutor(max_workers=1 if mode == 'actor' else threads,
+                                               thread_name_prefix=f"model-{mode}")
+
+    async def call(self, fn, *args):
+        if self.executor is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+
+def encode_reply(payload, accept, headers=()):
+    mimetype = parse_accept_header(accept, MIMEAccept).best_match(Codecs.FORMATS, default=Codecs.JSON)
+    return 200, mimetype, Codecs.encode(payload, mimetype), list(headers)
+
+
+def session_reply(decisions, accept):
+    # Same shape as Controller2's session replies, version also in a header
+    session = Controller2.session
+    return encode_reply({'version': session.version,
+                         'decisions': [Controller2.compact_decision(d) for d in decisions]},
+                        accept, [(b'x-session-version', str(session.version).encode())])
+
+
+def handle_decisions(body, content_type, accept, query):
+    world_state = Codecs.decode(body, content_type)
+    with Controller2.model_lock:
+        decisions = Controller2.model.get_decisions(world_state)
+    return encode_reply({'decisions': decisions}, accept)
+
+
+def handle_metrics(body, content_type, accept, query):
+    world_state = Codecs.decode(body, content_type)
+    with Controller2.model_lock:
+        metrics = Controller2.model.get_metrics(world_state)
+    return encode_reply({'metrics': metrics}, accept)
+
+
+def handle_session_snapshot(body, content_type, accept, query):
+    world_state = Codecs.decode(body, content_type)
+    with Controller2.model_lock:
+        session = Controller2.session
+        session.load_snapshot(world_state)
+        decisions = session.model.get_decisions(session.world_state())
+        return session_reply(decisions, accept)
+
+
+def handle_session_delta(body, content_type, accept, query):
+    if content_type == Codecs.PACKED:
+        raise Codecs.UnsupportedFormat("deltas have no packed layout, use JSON or msgpack")
+    delta = Codecs.decode(body, content_type)
+    with Controller2.model_lock:
+        session = Controller2.session
+        if delta.get('version', session.version) != session.version:
+            # The client missed an update; it has to resync with /session/snapshot
+            return 409, Codecs.JSON, json.dumps({'error': 'session out of date, send a snapshot',
+                                                 'version': session.version}).encode(), []
+        session.apply_delta(delta)
+        decisions = session.model.get_decisions(session.world_state())
+        return session_reply(decisions, accept)
+
+
+def handle_session_metrics(body, content_type, accept, query):
+    with Controller2.model_lock:
+        session = Controller2.session
+        metrics = session.model.get_metrics(session.world_state())
+    return encode_reply({'metrics': metrics}, accept)
+
+
+def handle_trace(body, content_type, accept, query):
+    clear = query.get('clear', [''])[0].lower() in ('1', 'true')
+    return 200, Codecs.JSON, json.dumps({'events': Controller2.trace.dump(clear=clear)}, default=str).encode(), []
+
+
+# path -> (method, handler); the same endpoints as the Flask app in Controller2
+ROUTES = {
+    '/get_decisions': ('POST', handle_decisions),
+    '/get_metrics': ('POST', handle_metrics),
+    '/session/snapshot': ('POST', handle_session_snapshot),
+    '/session/delta': ('POST', handle_session_delta),
+    '/session/metrics': ('GET', handle_session_metrics),
+    '/debug/trace': ('GET', handle_trace),
+}
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-headers', b'content-type, accept'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+    (b'access-control-expose-headers', b'x-session-version'),
+]
+
+runner = ModelRunner(os.environ.get('CONTROLLER_WORKER_MODEL', 'actor'),
+                     int(os.environ.get('CONTROLLER_THREADS', 4)))
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def respond(send, status, mimetype=None, body=b'', extra_headers=()):
+    headers = list(CORS_HEADERS) + list(extra_headers)
+    if mimetype:
+        headers.append((b'content-type', mimetype.encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def error_body(message):
+    return json.dumps({'error': message}).encode()
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                logger.info("Serving RobotWorld with the %s worker model", runner.mode)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                runner.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    route = ROUTES.get(scope['path'])
+    if route is None:
+        return await respond(send, 404, Codecs.JSON, error_body('not found'))
+    if scope['method'] == 'OPTIONS':  # CORS preflight from the dashboard
+        return await respond(send, 204)
+    method, handler = route
+    if scope['method'] != method:
+        return await respond(send, 405, Codecs.JSON, error_body('method not allowed'))
+
+    body = await read_body(receive)
+    headers = dict(scope['headers'])
+    content_type = parse_options_header(headers.get(b'content-type', b'').decode('latin-1'))[0] or Codecs.JSON
+    accept = headers.get(b'accept', b'').decode('latin-1')
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    try:
+        status, mimetype, payload, extra_headers = await runner.call(handler, body, content_type, accept, query)
+    except Codecs.UnsupportedFormat as e:
+        return await respond(send, 415, Codecs.JSON, error_body(str(e)))
+    except Controller2.InvalidDelta as e:
+        return await respond(send, 400, Codecs.JSON, error_body(str(e)))
+    except Exception as e:
+        logger.error("Error processing %s request: %s", scope['path'], e)
+        return await respond(send, 500, Codecs.JSON, error_body(str(e)))
+    await respond(send, status, mimetype, payload, extra_headers)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host=os.environ.get('CONTROLLER_HOST', '127.0.0.1'),
+                port=int(os.environ.get('CONTROLLER_PORT', 5000)), log_level='warning')
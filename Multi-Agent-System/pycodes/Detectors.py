@@ -0,0 +1,268 @@
+"""
+Detectores YOLOv5 intercambiables. Todos reciben una lista de frames BGR (OpenCV) y
+devuelven, por frame, un arreglo float32 N x 6: x1, y1, x2, y2, conf, cls.
+
+Backends:
+  hub        torch.hub.load('ultralytics/yolov5', ...), necesita red la primera vez
+  torch      pesos locales (.pt) con un clon local de yolov5, sin red
+  onnx       modelo exportado (export.py --include onnx --dynamic) en onnxruntime
+  onnx-int8  el mismo modelo cuantizado a int8 con quantize_onnx()
+
+Se elige con load_detector() o las variables VISION_DETECTOR, VISION_WEIGHTS,
+VISION_YOLOV5_DIR y VISION_ONNX_PROVIDERS (p. ej. OpenVINOExecutionProvider).
+"""
+import logging
+import os
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Nombres COCO en el orden de yolov5s; los backends ONNX no los traen en el modelo
+COCO_NAMES = [
+    'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat',
+    'traffic light', 'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat',
+    'dog', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe', 'backpack',
+    'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard', 'sports ball',
+    'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
+    'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
+    'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair',
+    'couch', 'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse',
+    'remote', 'keyboard', 'cell phone', 'microwave', 'oven', 'toaster', 'sink',
+    'refrigerator', 'book', 'clock', 'vase', 'scissors', 'teddy bear', 'hair drier',
+    'toothbrush',
+]
+
+
+class Detector(ABC):
+    """
+    Interfaz común. conf e iou son los umbrales de confianza y de NMS; classes limita
+    las clases devueltas (None = todas). Cada backend tiene que implementar detect.
+    """
+    device = 'cpu'
+
+    def __init__(self, conf=0.25, iou=0.45):
+        self.conf = conf
+        self.iou = iou
+        self.names = dict(enumerate(COCO_NAMES))
+
+    @abstractmethod
+    def detect(self, frames, classes=None):
+        """Lista de frames BGR -> un arreglo N x 6 por frame"""
+
+    def set_threads(self, threads):
+        pass
+
+
+class TorchDetector(Detector):
+    """
+    YOLOv5 en PyTorch: desde torch.hub o, con repo apuntando a un clon local de
+    ultralytics/yolov5, desde un archivo de pesos sin acceso a red.
+    """
+    def __init__(self, weights='yolov5s', repo='ultralytics/yolov5', conf=0.25, iou=0.45):
+        super().__init__(conf, iou)
+        import torch
+        self.torch = torch
+        if os.path.isdir(repo):
+            self.model = torch.hub.load(repo, 'custom', path=weights, source='local')
+        elif weights.endswith('.pt'):
+            self.model = torch.hub.load(repo, 'custom', path=weights)
+        else:
+            self.model = torch.hub.load(repo, weights)
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.model.to(self.device)
+        self.names = dict(self.model.names) if isinstance(self.model.names, dict) else dict(enumerate(self.model.names))
+
+    def detect(self, frames, classes=None):
+        self.model.conf = self.conf
+        self.model.iou = self.iou
+        self.model.classes = classes
+        # AutoShape espera RGB
+        results = self.model([frame[..., ::-1] for frame in frames])
+        return [rows.cpu().numpy() for rows in results.xyxy]
+
+    def set_threads(self, threads):
+        self.torch.set_num_threads(threads)
+
+
+class OnnxDetector(Detector):
+    """
+    Modelo YOLOv5 exportado a ONNX corriendo en onnxruntime. Si la exportación tiene
+    batch fijo se corre frame por frame; con --dynamic se hace una sola pasada.
+    """
+    def __init__(self, path='yolov5s.onnx', providers=None, conf=0.25, iou=0.45):
+        super().__init__(conf, iou)
+        import onnxruntime
+        self.onnxruntime = onnxruntime
+        self.path = path
+        self.providers = providers or ['CPUExecutionProvider']
+        self.options = onnxruntime.SessionOptions()
+        self.session = onnxruntime.InferenceSession(path, self.options, providers=self.providers)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        self.size = (height if isinstance(height, int) else 640, width if isinstance(width, int) else 640)
+        self.fixed_batch = batch if isinstance(batch, int) else None
+
+    def preprocess(self, frame):
+        """Letterbox a self.size, BGR -> RGB, CHW float32 en [0, 1]"""
+        height, width = frame.shape[:2]
+        scale = min(self.size[0] / height, self.size[1] / width)
+        resized = cv2.resize(frame, (round(width * scale), round(height * scale)))
+        pad_y = (self.size[0] - resized.shape[0]) // 2
+        pad_x = (self.size[1] - resized.shape[1]) // 2
+        canvas = np.full(self.size + (3,), 114, dtype=np.uint8)
+        canvas[pad_y:pad_y + resized.shape[0], pad_x:pad_x + resized.shape[1]] = resized
+        tensor = canvas[..., ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+        return tensor, scale, pad_x, pad_y
+
+    def postprocess(self, prediction, scale, pad_x, pad_y, shape, classes):
+        """
+        prediction: M x (5 + clases) con cx, cy, w, h, objectness y scores por clase.
+        Filtra por confianza, NMS por clase y deshace el letterbox.
+        """
+        scores = prediction[:, 5:] * prediction[:, 4:5]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        mask = conf > self.conf
+        if classes is not None:
+            mask &= np.isin(cls, classes)
+        boxes, conf, cls = prediction[mask, :4], conf[mask], cls[mask]
+        if not len(boxes):
+            return np.zeros((0, 6), dtype=np.float32)
+
+        xyxy = np.empty_like(boxes)
+        xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+        xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+        # NMS por clase desplazando las cajas de cada clase a una zona distinta
+        offset = xyxy + cls[:, None] * 4096.0
+        keep = cv2.dnn.NMSBoxes(
+            np.column_stack([offset[:, :2], offset[:, 2:] - offset[:, :2]]).tolist(),
+            conf.tolist(), self.conf, self.iou)
+        keep = np.asarray(keep, dtype=np.int64).reshape(-1)
+
+        xyxy = xyxy[keep]
+        xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad_x) / scale
+        xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad_y) / scale
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, shape[1])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, shape[0])
+        return np.column_stack([xyxy, conf[keep], cls[keep]]).astype(np.float32)
+
+    def detect(self, frames, classes=None):
+        prepared = [self.preprocess(frame) for frame in frames]
+        batch = np.stack([tensor for tensor, _, _, _ in prepared])
+        if self.fixed_batch == 1 and len(frames) > 1:
+            outputs = np.concatenate([
+                self.session.run(None, {self.input_name: batch[i:i + 1]})[0]
+                for i in range(len(batch))
+            ])
+        else:
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [
+            self.postprocess(prediction, scale, pad_x, pad_y, frame.shape, classes)
+            for prediction, (_, scale, pad_x, pad_y), frame in zip(outputs, prepared, frames)
+        ]
+
+    def set_threads(self, threads):
+        # onnxruntime fija los hilos al crear la sesión
+        self.options.intra_op_num_threads = threads
+        self.session = self.onnxruntime.InferenceSession(self.path, self.options, providers=self.providers)
+
+
+def quantize_onnx(source, target):
+    """
+    Cuantiza los pesos de un modelo ONNX a int8 (cuantización dinámica de onnxruntime)
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+    return target
+
+
+BACKENDS = ['hub', 'torch', 'onnx', 'onnx-int8']
+# Módulo pesado que importa cada backend, para medir el arranque en frío por separado
+BACKEND_MODULES = {'hub': 'torch', 'torch': 'torch', 'onnx': 'onnxruntime', 'onnx-int8': 'onnxruntime'}
+
+
+def configured_backend(backend=None):
+    return backend or os.environ.get('VISION_DETECTOR', 'hub')
+
+
+def load_detector(backend=None, weights=None, repo=None, providers=None, conf=0.25, iou=0.45):
+    """
+    Crea el detector configurado. Los argumentos que falten se toman de VISION_DETECTOR,
+    VISION_WEIGHTS, VISION_YOLOV5_DIR y VISION_ONNX_PROVIDERS (separados por comas).
+    """
+    backend = configured_backend(backend)
+    weights = weights or os.environ.get('VISION_WEIGHTS')
+    repo = repo or os.environ.get('VISION_YOLOV5_DIR')
+    if providers is None and os.environ.get('VISION_ONNX_PROVIDERS'):
+        providers = os.environ['VISION_ONNX_PROVIDERS'].split(',')
+
+    logger.info(f"Cargando detector {backend} ({weights or 'por defecto'})")
+    if backend == 'hub':
+        return TorchDetector(weights or 'yolov5s', 'ultralytics/yolov5', conf, iou)
+    if backend == 'torch':
+        # Sin un clon local torch.hub bajaría el repo de GitHub, que es lo que este backend evita
+        if not repo or not os.path.isdir(repo):
+            raise ValueError(f"El detector torch necesita VISION_YOLOV5_DIR apuntando a un clon "
+                             f"local de ultralytics/yolov5 (recibido: {repo!r})")
+        return TorchDetector(weights or 'yolov5s.pt', repo, conf, iou)
+    if backend == 'onnx':
+        return OnnxDetector(weights or 'yolov5s.onnx', providers, conf, iou)
+    if backend == 'onnx-int8':
+        return OnnxDetector(weights or 'yolov5s-int8.onnx', providers, conf, iou)
+    raise ValueError(f"Detector desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
+
+
+def iou(box, boxes):
+    """IoU de una caja x1, y1, x2, y2 contra cada fila de boxes"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def agreement(reference, candidate, threshold=0.5):
+    """
+    Empareja cajas N x 6 de la misma clase con IoU >= threshold, en orden de confianza;
+    devuelve (coincidencias, cajas de referencia, cajas candidatas, IoUs)
+    """
+    matched = np.zeros(len(reference), dtype=bool)
+    ious = []
+    for row in candidate[np.argsort(-candidate[:, 4])]:
+        same = (reference[:, 5] == row[5]) & ~matched
+        if not same.any():
+            continue
+        overlaps = np.where(same, iou(row, reference), 0.0)
+        best = overlaps.argmax()
+        if overlaps[best] >= threshold:
+            matched[best] = True
+            ious.append(overlaps[best])
+    return len(ious), len(reference), len(candidate), ious
+
+
+def draw(image, rows, names, color=(0, 255, 0)):
+    """
+    Dibuja cajas N x 6 (x1, y1, x2, y2, conf, cls) sobre la imagen
+    """
+    for x1, y1, x2, y2, conf, cls in rows.tolist():
+        cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
+        cv2.putText(image, f"{names[int(cls)]} {conf:.2f}", (int(x1), int(y1) - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return image
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cuantiza un modelo YOLOv5 ONNX a int8")
+    parser.add_argument('source', help="modelo exportado con export.py --include onnx")
+    parser.add_argument('target', nargs='?', default='yolov5s-int8.onnx')
+    args = parser.parse_args()
+    print(quantize_onnx(args.source, args.target))
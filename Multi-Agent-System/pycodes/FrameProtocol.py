@@ -0,0 +1,164 @@
+"""
+Protocolo de frames por UDP en fragmentos. Cada datagrama lleva una cabecera fija
+(little endian) seguida de un pedazo del JPEG:
+
+    magic 'RVF1' | agent_id int32 | frame_id uint32 | chunk_index uint16 |
+    chunk_count uint16 | timestamp_ms int64 (reloj del emisor, Unix)
+
+Así un frame puede superar los ~64 KB de un datagrama. Los datagramas que no empiezan
+con el magic se tratan como el formato anterior: agent_id int32 + JPEG completo.
+"""
+import struct
+import time
+from collections import deque, namedtuple
+
+MAGIC = b'RVF1'
+HEADER = struct.Struct('<4siIHHq')
+# Lo que entra en un datagrama IPv4 descontando cabeceras IP/UDP y la nuestra
+MAX_CHUNK = 65507 - HEADER.size
+# Un fragmento tardío nunca viene tantos frames atrás; más que esto es un emisor reiniciado
+MAX_REORDER = 256
+
+Frame = namedtuple('Frame', 'agent_id frame_id timestamp_ms payload')
+
+
+def now_ms():
+    return time.time() * 1000
+
+
+def is_chunked(datagram):
+    return datagram[:4] == MAGIC
+
+
+def chunk_agent_id(datagram):
+    return struct.unpack_from('<i', datagram, 4)[0]
+
+
+def split_frame(agent_id, frame_id, payload, timestamp_ms=None, chunk_size=MAX_CHUNK):
+    """
+    Parte un JPEG en datagramas con cabecera; el inverso de Reassembler
+    """
+    timestamp_ms = int(now_ms() if timestamp_ms is None else timestamp_ms)
+    chunk_count = max(1, -(-len(payload) // chunk_size))
+    return [
+        HEADER.pack(MAGIC, agent_id, frame_id & 0xFFFFFFFF, index, chunk_count, timestamp_ms)
+        + payload[index * chunk_size:(index + 1) * chunk_size]
+        for index in range(chunk_count)
+    ]
+
+
+def _newer(frame_id, other):
+    """frame_id es posterior a other, tolerando que el contador uint32 dé la vuelta"""
+    return 0 < (frame_id - other) & 0xFFFFFFFF < 0x80000000
+
+
+class Reassembler:
+    """
+    Junta los fragmentos de un agente. Un frame incompleto se da por perdido si pasa
+    timeout segundos sin completarse o si se completa uno más nuevo; los fragmentos de
+    frames ya entregados o descartados cuentan como tardíos, salvo que el emisor se haya
+    reiniciado (CameraAgents.cs vuelve a frame_id 0 en cada sesión): un frame_id anterior
+    con un timestamp posterior al último frame entregado, o más de MAX_REORDER frames
+    atrás, empieza de cero el estado del agente. También mide la latencia de
+    transporte (reloj local - timestamp del emisor; válida con emisor y receptor en la
+    misma máquina o con relojes sincronizados).
+    """
+    COUNTERS = ('chunks', 'duplicate_chunks', 'late_chunks', 'malformed',
+                'frames', 'lost_frames', 'bytes', 'restarts')
+
+    def __init__(self, timeout=0.5):
+        self.timeout = timeout
+        self.pending = {}
+        self.last_frame = None
+        self.last_timestamp = None
+        # Frames descartados hace poco, para que sus fragmentos rezagados no los revivan
+        self.abandoned = deque(maxlen=32)
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def add(self, datagram, now=None):
+        """
+        Procesa un datagrama; devuelve un Frame cuando se completa uno, si no None
+        """
+        now = time.perf_counter() if now is None else now
+        counters = self.counters
+        if len(datagram) < HEADER.size:
+            counters['malformed'] += 1
+            return None
+        _, agent_id, frame_id, index, count, timestamp_ms = HEADER.unpack_from(datagram)
+        if index >= count:
+            counters['malformed'] += 1
+            return None
+        counters['chunks'] += 1
+
+        delivered = self.last_frame is not None and not _newer(frame_id, self.last_frame)
+        if delivered and self._restarted(frame_id, timestamp_ms):
+            self._restart()
+            delivered = False
+        if delivered or frame_id in self.abandoned:
+            counters['late_chunks'] += 1
+            return None
+        self.expire(now)
+
+        entry = self.pending.get(frame_id)
+        if entry is None:
+            entry = self.pending[frame_id] = [now, [None] * count, 0]
+        chunks = entry[1]
+        if len(chunks) != count:
+            counters['malformed'] += 1
+            return None
+        if chunks[index] is not None:
+            counters['duplicate_chunks'] += 1
+            return None
+        # Copia: el datagrama puede ser una vista sobre un buffer que se reutiliza
+        chunks[index] = bytes(datagram[HEADER.size:])
+        entry[2] += 1
+        if entry[2] < count:
+            return None
+
+        # Completo: los frames anteriores que sigan pendientes ya no sirven
+        del self.pending[frame_id]
+        for stale in [other for other in self.pending if not _newer(other, frame_id)]:
+            self._abandon(stale)
+        self.last_frame = frame_id
+        self.last_timestamp = timestamp_ms
+        payload = b''.join(chunks)
+        counters['frames'] += 1
+        counters['bytes'] += len(payload)
+        latency = max(now_ms() - timestamp_ms, 0.0)
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        return Frame(agent_id, frame_id, timestamp_ms, payload)
+
+    def expire(self, now=None):
+        """Descarta los frames incompletos que llevan más de timeout esperando"""
+        if not self.pending:
+            return
+        now = time.perf_counter() if now is None else now
+        for frame_id in [f for f, entry in self.pending.items() if now - entry[0] > self.timeout]:
+            self._abandon(frame_id)
+
+    def _restarted(self, frame_id, timestamp_ms):
+        """frame_id no es posterior al último entregado: ¿emisor reiniciado o fragmento tardío?"""
+        return (timestamp_ms > self.last_timestamp
+                or (self.last_frame - frame_id) & 0xFFFFFFFF > MAX_REORDER)
+
+    def _restart(self):
+        self.pending.clear()
+        self.abandoned.clear()
+        self.last_frame = None
+        self.last_timestamp = None
+        self.counters['restarts'] += 1
+
+    def _abandon(self, frame_id):
+        del self.pending[frame_id]
+        self.abandoned.append(frame_id)
+        self.counters['lost_frames'] += 1
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['pending_frames'] = len(self.pending)
+        stats['mean_latency_ms'] = self.latency_total / stats['frames'] if stats['frames'] else 0.0
+        stats['max_latency_ms'] = self.latency_max
+        return stats
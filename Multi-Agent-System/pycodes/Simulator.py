@@ -0,0 +1,174 @@
+import argparse
+import hashlib
+import json
+import logging
+import math
+import random
+import time
+
+from Controller2 import RobotWorld
+
+# Arena layout from RobotWorld2.cs: robots start near the origin, cubes spawn on the red plane
+# and are delivered to the blue plane at RobotAgent.delivery_zone
+ROBOT_SPAWN = ((-5, 5), (-5, 5))
+CUBE_SPAWN = ((-20, -10), (-10, 10))
+ARENA = ((-60, 60), (-90, 90))
+
+
+def move_towards(position, target, step):
+    delta = [t - p for p, t in zip(position, target)]
+    distance = math.sqrt(sum(d * d for d in delta))
+    if distance <= step:
+        return list(target), distance
+    return [p + d / distance * step for p, d in zip(position, delta)], step
+
+
+class Simulation:
+    """
+    Kinematic stand-in for the Unity scene: feeds RobotWorld.get_decisions the same payload
+    RobotWorld2.cs would and moves the robots according to the answers. Seeded and deterministic.
+    """
+
+    def __init__(self, num_robots=5, num_cubes=10, seed=0, speed=5.0, dt=1.0,
+                 pickup_radius=1.0, respawn=True, params=None):
+        self.rng = random.Random(seed)
+        self.speed = speed
+        self.dt = dt
+        self.pickup_radius = pickup_radius
+        self.respawn = respawn
+
+        self.model = RobotWorld({'num_robots': num_robots, **(params or {})})
+        self.model.sim_setup()
+        delivery_zone = self.model.agents[0].delivery_zone
+        self.delivery_zone = [delivery_zone['x'], delivery_zone['y'], delivery_zone['z']]
+        # Controller metrics compare 'time' against each agent's wall-clock start_time
+        self.epoch = self.model.agents[0].state.start_time.timestamp()
+
+        self.robots = [{'position': self._spawn(ROBOT_SPAWN), 'has_cube': False}
+                       for _ in range(num_robots)]
+        self.cubes = {}
+        self.next_cube_id = 0
+        for _ in range(num_cubes):
+            self._spawn_cube()
+
+        self.steps = 0
+        self.delivered = 0
+        self.distance = 0.0
+        self.decide_seconds = 0.0
+        self.trace = hashlib.sha1()
+
+    def _spawn(self, area):
+        (x0, x1), (z0, z1) = area
+        return [self.rng.uniform(x0, x1), 0.0, self.rng.uniform(z0, z1)]
+
+    def _spawn_cube(self):
+        self.cubes[self.next_cube_id] = self._spawn(CUBE_SPAWN)
+        self.next_cube_id += 1
+
+    @property
+    def time(self):
+        return self.epoch + self.steps * self.dt
+
+    def world_state(self):
+        return {'agentStates': [
+            {'id': str(i), 'state': {
+                'position': dict(zip('xyz', robot['position'])),
+                'has_cube': robot['has_cube'],
+                'available_cubes': [{'id': cube_id, 'position': dict(zip('xyz', xyz)), 'is_carried': False}
+                                    for cube_id, xyz in self.cubes.items()],
+                'time': self.time,
+            }}
+            for i, robot in enumerate(self.robots)
+        ]}
+
+    def _move(self, robot, target):
+        robot['position'], moved = move_towards(robot['position'], target, self.speed * self.dt)
+        self.distance += moved
+
+    def step(self):
+        world_state = self.world_state()
+        start = time.perf_counter()
+        decisions = self.model.get_decisions(world_state)
+        self.decide_seconds += time.perf_counter() - start
+
+        # Decisions come back in agentStates order, which is how RobotWorld2.cs applies them
+        for robot, decision in zip(self.robots, decisions):
+            kind = decision['decision']
+            if kind == 'get_cube':
+                cube_id = decision['target_cube']['id']
+                if cube_id in self.cubes:
+                    self._move(robot, self.cubes[cube_id])
+                    if math.dist(robot['position'], self.cubes[cube_id]) <= self.pickup_radius:
+                        del self.cubes[cube_id]
+                        robot['has_cube'] = True
+            elif kind == 'deliver_cube':
+                self._move(robot, self.delivery_zone)
+            elif kind == 'put_cube':
+                robot['has_cube'] = False
+                self.delivered += 1
+                if self.respawn:
+                    self._spawn_cube()
+            elif kind == 'explore':
+                heading = self.rng.uniform(0, 2 * math.pi)
+                x, y, z = robot['position']
+                (x0, x1), (z0, z1) = ARENA
+                target = [min(x1, max(x0, x + math.cos(heading) * self.speed * self.dt)), y,
+                          min(z1, max(z0, z + math.sin(heading) * self.speed * self.dt))]
+                self._move(robot, target)
+
+        self.steps += 1
+        for robot in self.robots:
+            self.trace.update(repr((robot['position'], robot['has_cube'])).encode())
+
+    def run(self, steps):
+        start = time.perf_counter()
+        for _ in range(steps):
+            self.step()
+        wall = time.perf_counter() - start
+
+        controller_metrics = self.model.get_metrics(self.world_state())
+        minutes = self.steps * self.dt / 60
+        return {
+            'robots': len(self.robots),
+            'steps': self.steps,
+            'steps_per_second': self.steps / wall,
+            'decide_ms_per_step': self.decide_seconds / self.steps * 1000,
+            'cubes_delivered': self.delivered,
+            'cubes_per_minute': self.delivered / minutes,
+            'distance_per_cube': self.distance / max(1, self.delivered),
+            'controller_cubes_delivered': sum(m['cubes_delivered'] for m in controller_metrics),
+            'trace': self.trace.hexdigest(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the Controller2 policy without Unity")
+    parser.add_argument('--robots', type=int, nargs='+', default=[5, 50, 500])
+    parser.add_argument('--cubes', type=int, default=100)
+    parser.add_argument('--steps', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--speed', type=float, default=5.0)
+    parser.add_argument('--assignment', choices=['greedy', 'global'], default='greedy')
+    parser.add_argument('--engine', choices=['agent', 'numpy'], default='agent')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    logging.getLogger('Controller2').setLevel(logging.WARNING)
+    params = {'assignment': args.assignment, 'engine': args.engine}
+
+    results = []
+    print(f"{'robots':>6} {'steps/s':>9} {'cubes/min':>10} {'dist/cube':>10} {'delivered':>10}  trace")
+    for num_robots in args.robots:
+        sim = Simulation(num_robots, args.cubes, seed=args.seed, speed=args.speed, params=params)
+        result = sim.run(args.steps)
+        results.append(result)
+        print(f"{num_robots:>6} {result['steps_per_second']:>9.1f} {result['cubes_per_minute']:>10.1f} "
+              f"{result['distance_per_cube']:>10.1f} {result['cubes_delivered']:>10}  {result['trace'][:12]}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+Grabación y reproducción de los datagramas UDP de las cámaras, para medir el receptor
+sin Unity. Una captura es un archivo binario (little endian):
+
+    cabecera   'RVCAP1\\0\\0' | inicio (Unix, s) float64 | puerto base uint16
+    registro   offset_us uint64 | puerto uint16 | agent_id int32 | largo uint16 | datagrama
+
+offset_us es el instante de llegada relativo al inicio y agent_id sale de la cabecera del
+datagrama (fragmentado o formato anterior; -1 si no se pudo leer). El datagrama se
+guarda tal cual llegó.
+
+    python StreamCapture.py record capture.rvcap --ports 5123-5127 --seconds 60
+    python StreamCapture.py replay capture.rvcap --speed 2      # 0 = lo más rápido posible
+    python StreamCapture.py synth capture.rvcap ../images --agents 5 --fps 30 --seconds 10
+    python StreamCapture.py info capture.rvcap
+"""
+import glob
+import logging
+import os
+import selectors
+import socket
+import struct
+import time
+from collections import namedtuple
+
+import cv2
+
+from FrameProtocol import HEADER, MAX_CHUNK, chunk_agent_id, is_chunked, now_ms, split_frame
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'RVCAP1\0\0'
+FILE_HEADER = struct.Struct('<8sdH')
+RECORD = struct.Struct('<QHiH')
+# Campos de la cabecera de FrameProtocol que se reescriben al reproducir
+FRAME_ID = struct.Struct('<I')
+FRAME_ID_OFFSET = 8
+TIMESTAMP = struct.Struct('<q')
+TIMESTAMP_OFFSET = HEADER.size - TIMESTAMP.size
+
+Record = namedtuple('Record', 'offset port agent_id datagram')
+
+
+def datagram_agent_id(datagram):
+    if is_chunked(datagram):
+        return chunk_agent_id(datagram) if len(datagram) >= HEADER.size else -1
+    return struct.unpack_from('<i', datagram)[0] if len(datagram) >= 4 else -1
+
+
+class CaptureWriter:
+    """
+    Escribe registros a una captura; los offsets se pasan en segundos
+    """
+    def __init__(self, path, base_port, started=None):
+        self.file = open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(MAGIC, time.time() if started is None else started, base_port))
+        self.datagrams = 0
+        self.bytes = 0
+
+    def write(self, offset, port, datagram):
+        self.file.write(RECORD.pack(int(offset * 1e6), port, datagram_agent_id(datagram), len(datagram)))
+        self.file.write(datagram)
+        self.datagrams += 1
+        self.bytes += len(datagram)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_capture(path):
+    """
+    (inicio, puerto base, iterador de Record con offset en segundos)
+    """
+    f = open(path, 'rb')
+    magic, started, base_port = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != MAGIC:
+        f.close()
+        raise ValueError(f"{path} no es una captura de StreamCapture")
+
+    def records():
+        with f:
+            while True:
+                head = f.read(RECORD.size)
+                if len(head) < RECORD.size:
+                    return
+                offset_us, port, agent_id, length = RECORD.unpack(head)
+                yield Record(offset_us / 1e6, port, agent_id, f.read(length))
+    return started, base_port, records()
+
+
+def record(path, ports, seconds=None, is_running=lambda: True):
+    """
+    Escucha en ports (en lugar del receptor) y guarda cada datagrama hasta que pasen
+    seconds o is_running() devuelva False
+    """
+    selector = selectors.DefaultSelector()
+    sockets = []
+    for port in ports:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.bind(('0.0.0.0', port))
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ, port)
+        sockets.append(sock)
+    logger.info(f"Grabando puertos {ports[0]}-{ports[-1]} en {path}")
+
+    start = time.perf_counter()
+    with CaptureWriter(path, min(ports)) as writer:
+        try:
+            while is_running() and (seconds is None or time.perf_counter() - start < seconds):
+                for key, _ in selector.select(timeout=0.1):
+                    while True:
+                        try:
+                            datagram = key.fileobj.recv(65536)
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        writer.write(time.perf_counter() - start, key.data, datagram)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            selector.close()
+            for sock in sockets:
+                sock.close()
+    return {'datagrams': writer.datagrams, 'bytes': writer.bytes, 'seconds': time.perf_counter() - start}
+
+
+def replay(path, host='127.0.0.1', speed=1.0, base_port=None, shared_port=None,
+           agents=None, restamp=True, loops=1):
+    """
+    Reenvía una captura respetando los tiempos originales divididos por speed (speed=0:
+    sin esperas). base_port mueve todos los puertos manteniendo el desfase de cada agente;
+    shared_port los manda todos a uno. Con restamp cada frame lleva la hora en que se
+    envió su primer fragmento, así la latencia que mide el receptor es la del transporte
+    y el pipeline y no la edad de la captura. Al repetir (loops) los frame_id avanzan para
+    que el receptor no descarte las vueltas siguientes como fragmentos tardíos.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+    stats = {'datagrams': 0, 'bytes': 0, 'errors': 0, 'max_lag_ms': 0.0}
+    # Frame en curso por agente: (frame_id, timestamp asignado)
+    stamps = {}
+    first_id = last_id = None
+    shift = 0
+    start = time.perf_counter()
+    try:
+        for loop in range(loops):
+            _, recorded_base, records = read_capture(path)
+            loop_start = time.perf_counter()
+            for offset, port, agent_id, datagram in records:
+                if agents is not None and agent_id not in agents:
+                    continue
+                if speed > 0:
+                    delay = loop_start + offset / speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        stats['max_lag_ms'] = max(stats['max_lag_ms'], -delay * 1000)
+                if is_chunked(datagram) and len(datagram) >= HEADER.size:
+                    frame_id = FRAME_ID.unpack_from(datagram, FRAME_ID_OFFSET)[0]
+                    if loop == 0:
+                        first_id = frame_id if first_id is None else min(first_id, frame_id)
+                        last_id = frame_id if last_id is None else max(last_id, frame_id)
+                    datagram = bytearray(datagram)
+                    frame_id = (frame_id + shift) & 0xFFFFFFFF
+                    FRAME_ID.pack_into(datagram, FRAME_ID_OFFSET, frame_id)
+                    if restamp:
+                        current = stamps.get(agent_id)
+                        if current is None or current[0] != frame_id:
+                            current = stamps[agent_id] = (frame_id, int(now_ms()))
+                        TIMESTAMP.pack_into(datagram, TIMESTAMP_OFFSET, current[1])
+                if shared_port is not None:
+                    port = shared_port
+                elif base_port is not None:
+                    port = base_port + port - recorded_base
+                try:
+                    sock.sendto(datagram, (host, port))
+                except OSError as e:
+                    # Buffer de envío lleno a velocidad máxima; se cuenta como pérdida
+                    stats['errors'] += 1
+                    logger.debug(f"Error al reenviar a {port}: {e}")
+                    continue
+                stats['datagrams'] += 1
+                stats['bytes'] += len(datagram)
+            if first_id is not None:
+                shift += last_id - first_id + 1
+    finally:
+        sock.close()
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def synthesize(path, images, num_agents=5, fps=30, seconds=10, base_port=5123,
+               chunk_size=MAX_CHUNK, size=(320, 240), quality=80):
+    """
+    Captura sintética a partir de imágenes (como enviaría CameraAgents.cs en modo
+    fragmentado): cada agente recorre las imágenes desplazadas para que no coincidan
+    """
+    frames = []
+    for image_path in images:
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        ok, jpeg = cv2.imencode('.jpg', cv2.resize(image, size), [cv2.IMWRITE_JPEG_QUALITY, quality])
+        frames.append(jpeg.tobytes())
+    if not frames:
+        raise ValueError("No hay imágenes legibles para sintetizar la captura")
+
+    started = time.time()
+    with CaptureWriter(path, base_port, started) as writer:
+        for frame_id in range(int(fps * seconds)):
+            offset = frame_id / fps
+            for agent_id in range(num_agents):
+                payload = frames[(frame_id + agent_id) % len(frames)]
+                timestamp = started * 1000 + offset * 1000
+                for datagram in split_frame(agent_id, frame_id, payload, timestamp, chunk_size):
+                    writer.write(offset, base_port + agent_id, datagram)
+        return {'datagrams': writer.datagrams, 'bytes': writer.bytes}
+
+
+def summarize(path):
+    started, base_port, records = read_capture(path)
+    agents = {}
+    duration = 0.0
+    for offset, port, agent_id, datagram in records:
+        count, size = agents.get(agent_id, (0, 0))
+        agents[agent_id] = (count + 1, size + len(datagram))
+        duration = offset
+    return {
+        'started': started,
+        'base_port': base_port,
+        'seconds': duration,
+        'agents': {agent_id: {'datagrams': count, 'bytes': size}
+                   for agent_id, (count, size) in sorted(agents.items())},
+    }
+
+
+def _ports(text):
+    first, _, last = text.partition('-')
+    return list(range(int(first), int(last or first) + 1))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Grabación y reproducción de streams UDP de cámaras")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rec = commands.add_parser('record', help="grabar lo que llega a los puertos")
+    rec.add_argument('path')
+    rec.add_argument('--ports', type=_ports, default=_ports('5123-5127'), help="p. ej. 5123-5127")
+    rec.add_argument('--seconds', type=float, help="por defecto hasta Ctrl+C")
+
+    rep = commands.add_parser('replay', help="reenviar una captura")
+    rep.add_argument('path')
+    rep.add_argument('--host', default='127.0.0.1')
+    rep.add_argument('--speed', type=float, default=1.0, help="múltiplo de la velocidad original; 0 = sin esperas")
+    rep.add_argument('--base-port', type=int)
+    rep.add_argument('--shared-port', type=int)
+    rep.add_argument('--loops', type=int, default=1)
+    rep.add_argument('--keep-timestamps', action='store_true', help="no reescribir la hora de envío")
+
+    syn = commands.add_parser('synth', help="captura sintética desde imágenes")
+    syn.add_argument('path')
+    syn.add_argument('images', nargs='+', help="imágenes o carpetas")
+    syn.add_argument('--agents', type=int, default=5)
+    syn.add_argument('--fps', type=float, default=30)
+    syn.add_argument('--seconds', type=float, default=10)
+    syn.add_argument('--base-port', type=int, default=5123)
+    syn.add_argument('--chunk-size', type=int, default=MAX_CHUNK)
+
+    info = commands.add_parser('info', help="resumen de una captura")
+    info.add_argument('path')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'record':
+        print(record(args.path, args.ports, args.seconds))
+    elif args.command == 'replay':
+        print(replay(args.path, args.host, args.speed, args.base_port, args.shared_port,
+                     restamp=not args.keep_timestamps, loops=args.loops))
+    elif args.command == 'synth':
+        images = []
+        for path in args.images:
+            images.extend(sorted(glob.glob(os.path.join(path, '*'))) if os.path.isdir(path) else [path])
+        print(synthesize(args.path, images, args.agents, args.fps, args.seconds,
+                         args.base_port, args.chunk_size))
+    else:
+        print(summarize(args.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Métricas del receptor de visión: histogramas de latencia de buckets fijos, medidores de
+fps y un servidor HTTP local con el formato de texto de Prometheus.
+
+    GET /metrics        texto de Prometheus (para scrapear)
+    GET /metrics.json   la misma instantánea en JSON
+
+Registrar una muestra es una búsqueda binaria y una suma bajo un lock, así que se puede
+hacer por datagrama sin el costo de una línea de log.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores en segundos, de 50 µs a 2.5 s
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """
+    Histograma acumulable de duraciones (segundos) con buckets fijos. Con un solo hilo
+    escritor (shared=False, p. ej. el receptor por datagrama) se omite el lock, que es
+    la mitad del costo de cada muestra.
+    """
+    def __init__(self, buckets=BUCKETS, shared=True):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        if not shared:
+            self.observe = self._observe_single
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += seconds
+
+    def _observe_single(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+
+    def time(self):
+        """Context manager que registra lo que tarda el bloque"""
+        return _Timer(self)
+
+    def snapshot(self):
+        """
+        Conteos acumulados por límite (como los buckets 'le' de Prometheus; el de +Inf
+        es count), suma, cantidad y percentiles estimados en ms
+        """
+        with self.lock:
+            counts, total = list(self.counts), self.total
+        cumulative = []
+        running = 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        count = running
+        snapshot = {'buckets': list(zip(self.buckets, cumulative)),
+                    'sum': total, 'count': count,
+                    'mean_ms': total / count * 1000 if count else 0.0}
+        for name, q in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            snapshot[name] = self._quantile(cumulative, count, q) * 1000
+        return snapshot
+
+    def _quantile(self, cumulative, count, q):
+        """Interpolación lineal dentro del bucket, como histogram_quantile de Prometheus"""
+        if not count:
+            return 0.0
+        rank = q * count
+        index = bisect.bisect_left(cumulative, rank)
+        if index >= len(self.buckets):
+            return self.buckets[-1]
+        lower = self.buckets[index - 1] if index else 0.0
+        below = cumulative[index - 1] if index else 0
+        inside = cumulative[index] - below
+        return lower + (self.buckets[index] - lower) * ((rank - below) / inside if inside else 1.0)
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class RateMeter:
+    """
+    Eventos por segundo en una ventana deslizante (p. ej. frames publicados por agente)
+    """
+    def __init__(self, window=2.0):
+        self.window = window
+        self.lock = threading.Lock()
+        self.events = deque()
+
+    def mark(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self.lock:
+            self.events.append(now)
+            while self.events[0] < now - self.window:
+                self.events.popleft()
+
+    def rate(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self.lock:
+            while self.events and self.events[0] < now - self.window:
+                self.events.popleft()
+            return len(self.events) / self.window
+
+
+def render_prometheus(snapshot, prefix='vision'):
+    """
+    Texto de Prometheus a partir de la instantánea de AgentVisionReceiver.metrics()
+    """
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+    family('latency_seconds', 'histogram', "Latencia por etapa (handle por datagrama, el resto por frame)")
+    for stage, histogram in snapshot['latency'].items():
+        for bound, count in histogram['buckets']:
+            lines.append(f'{prefix}_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+        lines.append(f'{prefix}_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'{prefix}_latency_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+        lines.append(f'{prefix}_latency_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+    family('agent_frames_total', 'counter', "Frames por agente y evento")
+    for agent_id, agent in snapshot['agents'].items():
+        for event in ('received', 'dropped', 'decoded', 'inferred', 'published', 'lost'):
+            lines.append(f'{prefix}_agent_frames_total{{agent="{agent_id}",event="{event}"}} {agent[event]}')
+    family('agent_fps', 'gauge', "Frames publicados por segundo (ventana deslizante)")
+    for agent_id, agent in snapshot['agents'].items():
+        lines.append(f'{prefix}_agent_fps{{agent="{agent_id}"}} {agent["fps"]}')
+
+    family('stage_queue_depth', 'gauge', "Elementos esperando en la cola de la etapa")
+    for stage, stats in snapshot['stages'].items():
+        lines.append(f'{prefix}_stage_queue_depth{{stage="{stage}"}} {stats["depth"]}')
+    family('stage_dropped_total', 'counter', "Elementos descartados por cola llena")
+    for stage, stats in snapshot['stages'].items():
+        lines.append(f'{prefix}_stage_dropped_total{{stage="{stage}"}} {stats["dropped"]}')
+
+    family('socket_datagrams_total', 'counter', "Datagramas leídos por resultado")
+    for kind, count in snapshot['sockets'].items():
+        lines.append(f'{prefix}_socket_datagrams_total{{kind="{kind}"}} {count}')
+    family('model_ready', 'gauge', "1 cuando el modelo está cargado")
+    lines.append(f"{prefix}_model_ready {int(snapshot['ready'])}")
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """
+    Sirve snapshot() en /metrics (Prometheus) y /metrics.json
+    """
+    def __init__(self, snapshot, port=9108, host='127.0.0.1'):
+        self.snapshot = snapshot
+        self.httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.metrics = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="Metrics", daemon=True)
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self.thread.start()
+        logger.info(f"Métricas en {self.address}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        status = 200
+        if path == '/metrics':
+            body = render_prometheus(self.server.metrics.snapshot()).encode()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif path == '/metrics.json':
+            body = json.dumps(self.server.metrics.snapshot(), default=str).encode()
+            content_type = 'application/json'
+        else:
+            status, body, content_type = 404, b'not found', 'text/plain'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,224 @@
+"""
+Salida sin GUI de las cámaras de los agentes: la grilla compuesta y cada agente por
+separado como MJPEG sobre HTTP, leyendo del anillo de frames en memoria compartida.
+
+    GET /                     página con la grilla y cada agente
+    GET /grid.mjpg            grilla en vivo          ?fps=10&quality=70
+    GET /agent/<id>.mjpg      un agente en vivo       ?fps=10&quality=70
+    GET /grid.jpg, /agent/<id>.jpg   una sola imagen
+
+Cada vista se recodifica solo cuando cambió su contenido y la codificación se comparte
+entre todos los clientes que piden la misma calidad.
+"""
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class GridCompositor:
+    """
+    Grilla persistente de hasta columns columnas con el último frame de cada agente; solo
+    se copian las celdas cuya secuencia avanzó. version aumenta con cada cambio.
+    """
+    def __init__(self, ring, columns=3):
+        num_agents = ring.num_agents
+        cell_height, cell_width = ring.frames.shape[2:4]
+        rows = (num_agents + columns - 1) // columns
+        cols = min(columns, num_agents)
+        self.ring = ring
+        self.lock = threading.Lock()
+        self.version = 0
+        self.grid = np.zeros((cell_height * rows, cell_width * cols, 3), dtype=np.uint8)
+        self.cells = [
+            self.grid[(agent_id // cols)*cell_height:(agent_id // cols + 1)*cell_height,
+                      (agent_id % cols)*cell_width:(agent_id % cols + 1)*cell_width]
+            for agent_id in range(num_agents)
+        ]
+        self.shown = [0] * num_agents
+
+    def update(self):
+        """Copia las celdas nuevas; devuelve True si algo cambió"""
+        with self.lock:
+            changed = False
+            for agent_id, cell in enumerate(self.cells):
+                if int(self.ring.seq[agent_id]) != self.shown[agent_id]:
+                    self.shown[agent_id], _ = self.ring.read(agent_id, out=cell)
+                    changed = True
+            if changed:
+                self.version += 1
+            return changed
+
+
+class JpegCache:
+    """
+    Última codificación JPEG por (vista, calidad) junto con la versión que la generó
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.encodes = 0
+        self.hits = 0
+
+    def get(self, key, quality, version, encode):
+        with self.lock:
+            entry = self.entries.get((key, quality))
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+        jpeg = encode(quality)
+        with self.lock:
+            self.encodes += 1
+            self.entries[(key, quality)] = (version, jpeg)
+        return jpeg
+
+
+class VisionStreamServer:
+    """
+    Servidor HTTP (hilos de la biblioteca estándar) que publica el anillo como MJPEG
+    """
+    def __init__(self, ring, port=8090, host='127.0.0.1', default_fps=10, default_quality=70,
+                 histogram=None):
+        self.ring = ring
+        # Registra lo que tarda cada codificación (la latencia de 'display' sin ventana)
+        self.histogram = histogram
+        self.compositor = GridCompositor(ring)
+        self.cache = JpegCache()
+        self.default_fps = default_fps
+        self.default_quality = default_quality
+        self.running = True
+        self.viewers = 0
+        self.sent = 0
+        self.stats_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _StreamHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.vision = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="VisionStream", daemon=True)
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.thread.start()
+        logger.info(f"Streams MJPEG en {self.address}")
+        return self
+
+    def stop(self):
+        self.running = False
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        with self.stats_lock:
+            viewers, sent = self.viewers, self.sent
+        return {'viewers': viewers, 'frames_sent': sent,
+                'encodes': self.cache.encodes, 'cache_hits': self.cache.hits}
+
+    def snapshot(self, target, quality):
+        """(versión, jpeg) de 'grid' o de un agente (int); None si el agente no existe"""
+        if target == 'grid':
+            self.compositor.update()
+            version = self.compositor.version
+
+            def encode(q):
+                with self.compositor.lock:
+                    return self._encode(self.compositor.grid, q)
+        else:
+            if not 0 <= target < self.ring.num_agents:
+                return None
+            # Si la secuencia no avanzó se devuelve el JPEG en caché sin tocar el slot
+            version = int(self.ring.seq[target])
+
+            def encode(q):
+                # Copia propia: annotate puede volver a escribir el slot mientras se codifica
+                return self._encode(self.ring.read(target)[1], q)
+        return version, self.cache.get(target, quality, version, encode)
+
+    def _encode(self, image, quality):
+        started = time.perf_counter()
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if self.histogram is not None:
+            self.histogram.observe(time.perf_counter() - started)
+        return buffer.tobytes()
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    ROUTE = re.compile(r'^/(?:(grid)|agent/(\d+))\.(mjpg|jpg)$')
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        vision = self.server.vision
+        url = urlparse(self.path)
+        if url.path == '/':
+            return self._send(200, 'text/html; charset=utf-8', self._index(vision).encode())
+        match = self.ROUTE.match(url.path)
+        if not match:
+            return self._send(404, 'text/plain', b'not found')
+
+        query = parse_qs(url.query)
+        try:
+            fps = min(max(float(query.get('fps', [vision.default_fps])[0]), 0.1), 60.0)
+            quality = min(max(int(query.get('quality', [vision.default_quality])[0]), 10), 95)
+        except ValueError:
+            return self._send(400, 'text/plain', b'fps and quality must be numbers')
+        target = 'grid' if match.group(1) else int(match.group(2))
+        snapshot = vision.snapshot(target, quality)
+        if snapshot is None:
+            return self._send(404, 'text/plain', b'unknown agent')
+        if match.group(3) == 'jpg':
+            return self._send(200, 'image/jpeg', snapshot[1])
+        self._stream(vision, target, quality, 1.0 / fps)
+
+    def _stream(self, vision, target, quality, interval):
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        with vision.stats_lock:
+            vision.viewers += 1
+        sent_version = None
+        try:
+            while vision.running:
+                started = time.perf_counter()
+                version, jpeg = vision.snapshot(target, quality)
+                # Solo se envía cuando hay algo nuevo; el cliente conserva la última imagen
+                if version != sent_version:
+                    self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                                     + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+                    self.wfile.flush()
+                    sent_version = version
+                    with vision.stats_lock:
+                        vision.sent += 1
+                time.sleep(max(interval - (time.perf_counter() - started), 0))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with vision.stats_lock:
+                vision.viewers -= 1
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _index(vision):
+        agents = ''.join(
+            f'<figure><img src="/agent/{i}.mjpg"><figcaption>Agent {i}</figcaption></figure>'
+            for i in range(vision.ring.num_agents)
+        )
+        return (f'<html><head><title>Agent Vision Streams</title></head><body>'
+                f'<h1>Agent Vision Streams</h1><img src="/grid.mjpg"><div>{agents}</div></body></html>')
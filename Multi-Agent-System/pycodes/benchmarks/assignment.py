@@ -0,0 +1,33 @@
+"""
+Greedy per-agent claiming vs global cube assignment in the headless simulator.
+
+    python -m benchmarks.assignment --robots 5 20 50 --cubes 40 --steps 300
+"""
+import argparse
+import logging
+
+from Simulator import Simulation
+
+logging.getLogger('Controller2').setLevel(logging.WARNING)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--robots', type=int, nargs='+', default=[5, 20, 50])
+    parser.add_argument('--cubes', type=int, default=40)
+    parser.add_argument('--steps', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    modes = {'greedy': {}, 'global': {'assignment': 'global'}}
+    print(f"{'robots':>6} {'mode':>7} {'cubes/min':>10} {'dist/cube':>10} {'ms/tick':>8}")
+    for num_robots in args.robots:
+        for name, params in modes.items():
+            sim = Simulation(num_robots, args.cubes, seed=args.seed, params=params)
+            result = sim.run(args.steps)
+            print(f"{num_robots:>6} {name:>7} {result['cubes_per_minute']:>10.1f} "
+                  f"{result['distance_per_cube']:>10.1f} {result['decide_ms_per_step']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
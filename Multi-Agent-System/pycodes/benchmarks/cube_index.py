@@ -0,0 +1,47 @@
+"""
+Tick latency of RobotWorld.get_decisions with and without the shared CubeIndex.
+
+    python -m benchmarks.cube_index --robots 32 --cubes 100 1000 10000 20000
+"""
+import argparse
+import logging
+import time
+
+from Controller2 import RobotWorld
+from benchmarks.payloads import make_world_state
+
+logging.getLogger('Controller2').setLevel(logging.WARNING)
+
+
+def time_tick(num_robots, num_cubes, spatial_index, repeat):
+    samples = []
+    decisions = None
+    for rep in range(repeat):
+        world_state = make_world_state(num_robots, num_cubes, seed=rep)
+        model = RobotWorld({'num_robots': num_robots, 'spatial_index': spatial_index})
+        model.sim_setup()
+        start = time.perf_counter()
+        decisions = model.get_decisions(world_state)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2], decisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--robots', type=int, default=32)
+    parser.add_argument('--cubes', type=int, nargs='+', default=[100, 1000, 5000, 10000, 20000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'cubes':>8} {'linear ms':>10} {'index ms':>10} {'speedup':>8}  same")
+    for num_cubes in args.cubes:
+        linear, linear_decisions = time_tick(args.robots, num_cubes, False, args.repeat)
+        indexed, indexed_decisions = time_tick(args.robots, num_cubes, True, args.repeat)
+        same = linear_decisions == indexed_decisions
+        print(f"{num_cubes:>8} {linear * 1000:>10.2f} {indexed * 1000:>10.2f} "
+              f"{linear / indexed:>7.1f}x  {same}")
+
+
+if __name__ == '__main__':
+    main()
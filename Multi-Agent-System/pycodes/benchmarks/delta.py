@@ -0,0 +1,81 @@
+"""
+Full-snapshot /get_decisions vs the /session/delta protocol: request size, JSON parse time and
+end-to-end latency through the Flask test client.
+
+    python -m benchmarks.delta --robots 5 50 --cubes 100 1000
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+import Controller2
+from benchmarks.endpoints import fresh_model, measure
+from benchmarks.payloads import make_world_state
+
+logging.getLogger('Controller2').setLevel(logging.WARNING)
+
+
+def make_delta(world_state, rng, next_cube_id, moved_cubes=2):
+    """Every robot moved, a couple of cubes picked up and as many new ones spawned."""
+    cube_ids = [cube['id'] for cube in world_state['agentStates'][0]['state']['available_cubes']]
+    return {
+        'agents': [{'id': entry['id'],
+                    'state': {'position': {'x': rng.uniform(-5, 5), 'y': 0, 'z': rng.uniform(-5, 5)},
+                              'time': 2.0}}
+                   for entry in world_state['agentStates']],
+        'cubes_removed': rng.sample(cube_ids, min(moved_cubes, len(cube_ids))),
+        'cubes_added': [{'id': next_cube_id + i,
+                         'position': {'x': rng.uniform(-20, -10), 'y': 0, 'z': rng.uniform(-10, 10)}}
+                        for i in range(moved_cubes)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--robots', type=int, nargs='+', default=[5, 50])
+    parser.add_argument('--cubes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    client = Controller2.app.test_client()
+
+    def post(route, body):
+        response = client.post(route, data=body, content_type='application/json')
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return response.get_json()
+
+    print(f"{'robots':>6} {'cubes':>6} {'path':>9} {'bytes':>10} {'parse ms':>9} {'p50 ms':>9}")
+    for num_robots in args.robots:
+        for num_cubes in args.cubes:
+            world_state = make_world_state(num_robots, num_cubes, time=1.0)
+            full_body = json.dumps(world_state)
+
+            # Same world through both paths on fresh models must give the same answers
+            Controller2.model = fresh_model(num_robots, {})
+            full = post('/get_decisions', full_body)['decisions']
+            Controller2.session = Controller2.WorldSession(num_robots)
+            snapshot = post('/session/snapshot', full_body)['decisions']
+            assert [Controller2.compact_decision(d) for d in full] == snapshot
+
+            rng = random.Random(0)
+            delta_bodies = [json.dumps(make_delta(world_state, rng, num_cubes + 2 * i))
+                            for i in range(args.iterations + 3)]
+            bodies = iter(delta_bodies)
+
+            rows = {
+                'full': (full_body, measure(lambda: post('/get_decisions', full_body), args.iterations, 3)),
+                'delta': (delta_bodies[0], measure(lambda: post('/session/delta', next(bodies)),
+                                                   args.iterations, 3)),
+            }
+            for name, (body, stats) in rows.items():
+                start = time.perf_counter()
+                json.loads(body)
+                parse_ms = (time.perf_counter() - start) * 1000
+                print(f"{num_robots:>6} {num_cubes:>6} {name:>9} {len(body):>10} "
+                      f"{parse_ms:>9.3f} {stats['p50_ms']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
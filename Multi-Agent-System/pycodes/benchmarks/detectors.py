@@ -0,0 +1,73 @@
+"""
+CPU latency and agreement of the detector backends (Detectors.py) on a fixed image set.
+The first backend is the reference: the others report precision/recall against its
+detections (same class, IoU >= 0.5) and the mean IoU of the matched boxes.
+
+    python -m benchmarks.detectors --backends torch onnx onnx-int8 \
+        --weights torch=yolov5s.pt onnx=yolov5s.onnx onnx-int8=yolov5s-int8.onnx
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from Detectors import BACKENDS, agreement, load_detector
+from benchmarks.endpoints import percentile
+
+IMAGES = os.path.join(os.path.dirname(__file__), '..', '..', 'images', '*.png')
+
+
+def run_backend(detector, images, runs):
+    detector.detect(images[:1])  # warmup
+    latencies = []
+    detections = None
+    for _ in range(runs):
+        results = []
+        for image in images:
+            start = time.perf_counter()
+            results.extend(detector.detect([image]))
+            latencies.append(time.perf_counter() - start)
+        detections = detections or results
+    return latencies, detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backends', nargs='+', default=['hub', 'onnx', 'onnx-int8'], choices=BACKENDS)
+    parser.add_argument('--weights', nargs='*', default=[], metavar='BACKEND=PATH')
+    parser.add_argument('--images', default=IMAGES, help="glob of the fixed image set")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    weights = dict(item.split('=', 1) for item in args.weights)
+    paths = sorted(glob.glob(args.images))
+    images = [cv2.imread(path) for path in paths]
+    print(f"{len(images)} images from {args.images}, {args.threads} threads")
+    print(f"{'backend':>10} {'p50 ms':>8} {'p95 ms':>8} {'dets':>6} {'precision':>9} {'recall':>7} {'IoU':>6}")
+
+    reference = None
+    for backend in args.backends:
+        detector = load_detector(backend, weights.get(backend))
+        detector.set_threads(args.threads)
+        latencies, detections = run_backend(detector, images, args.runs)
+        p50, p95 = percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000
+        total = sum(len(rows) for rows in detections)
+        if reference is None:
+            reference = detections
+            print(f"{backend:>10} {p50:>8.1f} {p95:>8.1f} {total:>6} {'ref':>9} {'ref':>7} {'':>6}")
+            continue
+        stats = [agreement(ref, rows) for ref, rows in zip(reference, detections)]
+        matches = sum(s[0] for s in stats)
+        precision = matches / max(sum(s[2] for s in stats), 1)
+        recall = matches / max(sum(s[1] for s in stats), 1)
+        ious = [value for s in stats for value in s[3]]
+        mean_iou = float(np.mean(ious)) if ious else 0.0
+        print(f"{backend:>10} {p50:>8.1f} {p95:>8.1f} {total:>6} {precision:>9.3f} {recall:>7.3f} {mean_iou:>6.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Latency of get_decisions/get_metrics, in process and through the Flask app, over a grid of
+synthetic payload sizes. Results go to JSON so two commits can be compared.
+
+    python -m benchmarks.endpoints --out before.json
+    python -m benchmarks.endpoints --out after.json --compare before.json
+    python -m benchmarks.endpoints --robots 100 --cubes 1000 --param engine=numpy
+"""
+import argparse
+import gc
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import Controller2
+from Controller2 import RobotWorld
+from benchmarks.payloads import make_world_state
+
+logging.getLogger('Controller2').setLevel(logging.WARNING)
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples):
+    mean = sum(samples) / len(samples)
+    return {
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'mean_ms': mean * 1000,
+        'rps': 1 / mean,
+        'iterations': len(samples),
+    }
+
+
+def fresh_model(num_robots, params):
+    model = RobotWorld({'num_robots': num_robots, **params})
+    model.sim_setup()
+    return model
+
+
+def measure(call, iterations, warmup, before=None):
+    """Time call() iterations times; before() runs untimed ahead of each call."""
+    samples = []
+    for i in range(warmup + iterations):
+        if before:
+            before()
+        gc.collect()  # Keep collections of earlier garbage out of the timed call
+        start = time.perf_counter()
+        call()
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            samples.append(elapsed)
+    return summarize(samples)
+
+
+def run_case(num_robots, num_cubes, params, iterations, warmup):
+    """
+    Decisions are timed on a fresh model each iteration, so every agent plans from scratch
+    (the expensive tick). Metrics are timed against one long-lived model.
+    """
+    world_state = make_world_state(num_robots, num_cubes, carrying=0.3, time=1.0)
+    body = json.dumps(world_state)
+    client = Controller2.app.test_client()
+    holder = {}
+
+    def reset():
+        holder['model'] = Controller2.model = fresh_model(num_robots, params)
+
+    def post(route):
+        response = client.post(route, data=body, content_type='application/json')
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    results = {
+        'inprocess.get_decisions': measure(lambda: holder['model'].get_decisions(world_state),
+                                           iterations, warmup, reset),
+        'flask./get_decisions': measure(lambda: post('/get_decisions'), iterations, warmup, reset),
+    }
+    reset()
+    holder['model'].get_decisions(world_state)
+    results['inprocess.get_metrics'] = measure(lambda: holder['model'].get_metrics(world_state),
+                                               iterations, warmup)
+    results['flask./get_metrics'] = measure(lambda: post('/get_metrics'), iterations, warmup)
+
+    return [{'target': target, 'robots': num_robots, 'cubes': num_cubes, **stats}
+            for target, stats in results.items()]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_key(result):
+    return (result['target'], result['robots'], result['cubes'])
+
+
+def compare(results, baseline_path, tolerance):
+    """Print p50 ratios against a previous run; returns the cases that got slower than tolerance."""
+    with open(baseline_path) as f:
+        baseline = {case_key(r): r for r in json.load(f)['results']}
+
+    regressions = []
+    print(f"\n{'target':<24} {'robots':>6} {'cubes':>6} {'base p50':>9} {'p50':>9} {'ratio':>6}")
+    for result in results:
+        before = baseline.get(case_key(result))
+        if before is None:
+            continue
+        ratio = result['p50_ms'] / before['p50_ms']
+        flag = '  REGRESSION' if ratio > 1 + tolerance else ''
+        if flag:
+            regressions.append(result)
+        print(f"{result['target']:<24} {result['robots']:>6} {result['cubes']:>6} "
+              f"{before['p50_ms']:>9.3f} {result['p50_ms']:>9.3f} {ratio:>6.2f}{flag}")
+    return regressions
+
+
+def parse_param(text):
+    key, _, value = text.partition('=')
+    for cast in (int, float):
+        try:
+            return key, cast(value)
+        except ValueError:
+            pass
+    return key, {'true': True, 'false': False}.get(value.lower(), value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--robots', type=int, nargs='+', default=[5, 50, 200])
+    parser.add_argument('--cubes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--param', action='append', default=[], type=parse_param,
+                        help='RobotWorld parameter as key=value, e.g. engine=numpy')
+    parser.add_argument('--out', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='p50 slowdown (fraction) reported as a regression')
+    args = parser.parse_args()
+    params = dict(args.param)
+
+    results = []
+    print(f"{'target':<24} {'robots':>6} {'cubes':>6} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for num_robots in args.robots:
+        for num_cubes in args.cubes:
+            for result in run_case(num_robots, num_cubes, params, args.iterations, args.warmup):
+                results.append(result)
+                print(f"{result['target']:<24} {num_robots:>6} {num_cubes:>6} "
+                      f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['rps']:>9.1f}")
+
+    if args.out:
+        meta = {
+            'revision': git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'params': params,
+        }
+        with open(args.out, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
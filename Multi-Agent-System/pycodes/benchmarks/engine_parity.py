@@ -0,0 +1,106 @@
+"""
+Replays a recorded corpus of /get_decisions payloads through the per-agent engine and the
+NumPy engine and checks that every decision matches.
+
+    python -m benchmarks.engine_parity            # replay data/decision_corpus.json
+    python -m benchmarks.engine_parity --record   # regenerate the corpus
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+
+from Controller2 import RobotWorld
+
+logging.getLogger('Controller2').setLevel(logging.WARNING)
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'decision_corpus.json')
+
+
+def record(num_robots=12, num_cubes=80, num_ticks=60, seed=7):
+    """
+    Compact corpus: per tick, robots as [id, x, y, z, has_cube] and cubes as [id, x, y, z].
+    Positions sit on a half-unit grid so equal distances (and the tie-breaking rule) show up,
+    half the robots start at the delivery zone, and the cubes run out before the last tick.
+    """
+    rng = random.Random(seed)
+    snap = lambda v: round(v * 2) / 2
+    robots = [[i, snap(rng.uniform(-5, 5)) + (30 if i % 2 else 0), 0, snap(rng.uniform(-2, 2)), False]
+              for i in range(num_robots)]
+    cubes = [[i, snap(rng.uniform(-20, -10)), 0, snap(rng.uniform(-10, 10))] for i in range(num_cubes)]
+
+    ticks = []
+    for _ in range(num_ticks):
+        ticks.append({'robots': [list(r) for r in robots], 'cubes': [list(c) for c in cubes]})
+        for robot in robots:
+            robot[1] = snap(robot[1] + rng.uniform(-1, 1))
+            robot[3] = snap(robot[3] + rng.uniform(-1, 1))
+            if rng.random() < 0.15:
+                robot[4] = not robot[4]
+        # Picked-up cubes leave the snapshot; the odd one gets knocked to a new spot
+        for _ in range(rng.randint(0, 3)):
+            if cubes:
+                cubes.pop(rng.randrange(len(cubes)))
+        if cubes and rng.random() < 0.3:
+            cube = rng.choice(cubes)
+            cube[1], cube[3] = snap(cube[1] + 1), snap(cube[3] - 1)
+        if rng.random() < 0.1:
+            rng.shuffle(robots)
+
+    with open(CORPUS_PATH, 'w') as f:
+        json.dump({'ticks': ticks}, f, separators=(',', ':'))
+    return len(ticks)
+
+
+def expand(tick):
+    """Turn a compact corpus tick back into the payload RobotWorld2.cs would send."""
+    return {'agentStates': [
+        {'id': str(robot_id),
+         'state': {
+             'position': {'x': x, 'y': y, 'z': z},
+             'has_cube': has_cube,
+             'available_cubes': [
+                 {'id': cube_id, 'position': {'x': cx, 'y': cy, 'z': cz}, 'is_carried': False}
+                 for cube_id, cx, cy, cz in tick['cubes']
+             ],
+         }}
+        for robot_id, x, y, z, has_cube in tick['robots']
+    ]}
+
+
+def replay(ticks, **params):
+    model = RobotWorld({'num_robots': len(ticks[0]['robots']), **params})
+    model.sim_setup()
+    return [model.get_decisions(expand(tick)) for tick in ticks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--record', action='store_true', help='regenerate the corpus first')
+    args = parser.parse_args()
+
+    if args.record:
+        print(f"Recorded {record()} ticks to {CORPUS_PATH}")
+
+    with open(CORPUS_PATH) as f:
+        ticks = json.load(f)['ticks']
+
+    reference = replay(ticks, spatial_index=False)
+    engines = {
+        'agent+index': replay(ticks, spatial_index=True),
+        'numpy': replay(ticks, engine='numpy'),
+    }
+    failed = False
+    for name, decisions in engines.items():
+        mismatches = [t for t, (a, b) in enumerate(zip(reference, decisions)) if a != b]
+        print(f"{name:>12}: {len(ticks) - len(mismatches)}/{len(ticks)} ticks identical")
+        if mismatches:
+            failed = True
+            print(f"{'':>12}  first mismatch at tick {mismatches[0]}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
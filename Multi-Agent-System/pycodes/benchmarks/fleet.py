@@ -0,0 +1,41 @@
+"""
+Per-agent tick cost and memory of RobotWorld as the fleet grows. Both should stay flat.
+
+    python -m benchmarks.fleet --robots 100 1000 5000
+"""
+import argparse
+import logging
+import tracemalloc
+
+from benchmarks.endpoints import fresh_model, measure
+from benchmarks.payloads import make_world_state
+
+logging.getLogger('Controller2').setLevel(logging.WARNING)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--robots', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--cubes', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'robots':>7} {'tick us/agent':>14} {'metrics us/agent':>17} {'bytes/agent':>12}")
+    for num_robots in args.robots:
+        world_state = make_world_state(num_robots, args.cubes, carrying=0.3, time=1.0)
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        model = fresh_model(num_robots, {})
+        model.get_decisions(world_state)  # Binds every Unity id to an agent
+        memory = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        tick = measure(lambda: model.get_decisions(world_state), args.iterations, 2)
+        metrics = measure(lambda: model.get_metrics(world_state), args.iterations, 2)
+        print(f"{num_robots:>7} {tick['p50_ms'] * 1000 / num_robots:>14.2f} "
+              f"{metrics['p50_ms'] * 1000 / num_robots:>17.2f} {memory / num_robots:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
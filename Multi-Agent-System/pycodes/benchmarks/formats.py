@@ -0,0 +1,71 @@
+"""
+JSON vs MessagePack vs the packed struct layout: payload size, encode/decode cost on both
+ends, and end-to-end /get_decisions latency through the Flask test client.
+
+    python -m benchmarks.formats --robots 5 50 --cubes 100 1000
+"""
+import argparse
+import json
+import logging
+
+import Codecs
+import Controller2
+from benchmarks.endpoints import fresh_model, measure
+from benchmarks.payloads import make_world_state
+
+logging.getLogger('Controller2').setLevel(logging.WARNING)
+
+CLIENT_ENCODERS = {
+    Codecs.JSON: lambda world_state: json.dumps(world_state).encode(),
+    Codecs.MSGPACK: lambda world_state: Codecs.msgpack.packb(world_state),
+    Codecs.PACKED: Codecs.pack_world_state,
+}
+CLIENT_DECODERS = {
+    Codecs.JSON: json.loads,
+    Codecs.MSGPACK: lambda body: Codecs.msgpack.unpackb(body),
+    Codecs.PACKED: Codecs.unpack_decisions,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--robots', type=int, nargs='+', default=[5, 50])
+    parser.add_argument('--cubes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    formats = [f for f in Codecs.FORMATS if f != Codecs.MSGPACK or Codecs.msgpack is not None]
+    client = Controller2.app.test_client()
+
+    print(f"{'robots':>6} {'cubes':>6} {'format':>27} {'req bytes':>10} {'resp bytes':>10} "
+          f"{'req enc':>8} {'req dec':>8} {'resp enc':>8} {'resp dec':>8} {'e2e p50':>8}  (ms)")
+    for num_robots in args.robots:
+        for num_cubes in args.cubes:
+            world_state = make_world_state(num_robots, num_cubes, time=1.0)
+            model = fresh_model(num_robots, {})
+            decisions = {'decisions': model.get_decisions(world_state)}
+
+            for mimetype in formats:
+                body = CLIENT_ENCODERS[mimetype](world_state)
+                response_body = Codecs.encode(decisions, mimetype)
+                req_enc = measure(lambda: CLIENT_ENCODERS[mimetype](world_state), args.iterations, 2)
+                req_dec = measure(lambda: Codecs.decode(body, mimetype), args.iterations, 2)
+                resp_enc = measure(lambda: Codecs.encode(decisions, mimetype), args.iterations, 2)
+                resp_dec = measure(lambda: CLIENT_DECODERS[mimetype](response_body), args.iterations, 2)
+
+                Controller2.model = model
+                headers = {'Content-Type': mimetype, 'Accept': mimetype}
+
+                def post():
+                    response = client.post('/get_decisions', data=body, headers=headers)
+                    assert response.status_code == 200, response.get_data(as_text=True)
+                    CLIENT_DECODERS[mimetype](response.get_data())
+
+                e2e = measure(post, args.iterations, 2)
+                print(f"{num_robots:>6} {num_cubes:>6} {mimetype:>27} {len(body):>10} {len(response_body):>10} "
+                      f"{req_enc['p50_ms']:>8.3f} {req_dec['p50_ms']:>8.3f} {resp_enc['p50_ms']:>8.3f} "
+                      f"{resp_dec['p50_ms']:>8.3f} {e2e['p50_ms']:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
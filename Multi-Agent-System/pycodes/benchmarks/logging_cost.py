@@ -0,0 +1,89 @@
+"""
+Request cost at 100 agents with the old always-on DEBUG logging vs the sampled trace log.
+Log output goes to os.devnull so formatting and writing are measured, not the terminal.
+
+    python -m benchmarks.logging_cost --robots 100 --cubes 100
+"""
+import argparse
+import logging
+import os
+
+import Controller2
+from benchmarks.endpoints import fresh_model, measure
+from benchmarks.payloads import make_world_state
+
+
+class EagerTrace(Controller2.TraceLog):
+    """
+    The logging RobotAgent did before TraceLog: every event builds its f-string message up
+    front, whatever the log level, and hands it to logger.debug. The messages are the old ones.
+    """
+
+    def sampled(self, agent_id, event):
+        return True
+
+    def record(self, event, agent_id, **fields):
+        logger = Controller2.logger
+        if event == 'moved':
+            logger.debug(f"Agent {agent_id} traveled {fields['distance']} units.")
+        elif event == 'metrics':
+            current_time = fields['current_time']
+            elapsed_time = fields['minutes_elapsed'] * 60
+            logger.debug(f"float Elapsed time: {elapsed_time}, current_time: {current_time}, "
+                         f"start_time: {current_time - elapsed_time}")
+            logger.debug(f"Agent {agent_id} metrics: {fields['cubes_delivered']} cubes delivered in "
+                         f"{fields['minutes_elapsed']} minutes. Rate: {fields['rate']}, "
+                         f"cubecount: {fields['cubes_delivered']}")
+        elif event == 'targeting':
+            logger.debug(f"Agent {agent_id} targeting cube {fields['cube']} at distance {fields['distance']}")
+        elif event == 'no_cubes':
+            logger.debug(f"Agent {agent_id} found no available cubes")
+        elif event == 'delivered':
+            logger.debug(f"Agent {agent_id} completed delivery. Total deliveries: {fields['cubes_delivered']}")
+
+
+# name -> (Controller2 log level, trace sample_every; None = the old eager logging)
+CONFIGS = {
+    'debug, eager f-strings (old)': (logging.DEBUG, None),
+    'debug, every event': (logging.DEBUG, 1),
+    'debug, 1 in 10': (logging.DEBUG, 10),
+    'info, 1 in 10 (default)': (logging.INFO, 10),
+    'info, tracing off': (logging.INFO, 0),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--robots', type=int, default=100)
+    parser.add_argument('--cubes', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=30)
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, 'w')
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.StreamHandler(devnull))
+
+    world_state = make_world_state(args.robots, args.cubes, carrying=0.3, time=1.0)
+    sampled_trace = Controller2.trace
+    print(f"{'config':<28} {'decisions p50':>14} {'metrics p50':>12}")
+    for name, (level, sample_every) in CONFIGS.items():
+        logging.getLogger('Controller2').setLevel(level)
+        if sample_every is None:
+            Controller2.trace = EagerTrace()
+        else:
+            Controller2.trace = sampled_trace
+            sampled_trace.configure(sample_every=sample_every)
+        holder = {}
+
+        def reset():
+            holder['model'] = fresh_model(args.robots, {})
+
+        decisions = measure(lambda: holder['model'].get_decisions(world_state), args.iterations, 3, reset)
+        metrics = measure(lambda: holder['model'].get_metrics(world_state), args.iterations, 3)
+        print(f"{name:<28} {decisions['p50_ms']:>11.3f} ms {metrics['p50_ms']:>9.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
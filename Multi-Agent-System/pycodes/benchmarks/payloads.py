@@ -0,0 +1,30 @@
+import random
+
+
+def make_world_state(num_robots, num_cubes, seed=0, carrying=0.0, time=0):
+    """
+    Synthetic /get_decisions payload shaped like the one RobotWorld2.cs sends: every agent
+    gets its own copy of the same available_cubes snapshot.
+    """
+    rng = random.Random(seed)
+    cubes = [
+        {'id': i,
+         'position': {'x': rng.uniform(-20, -10), 'y': 0, 'z': rng.uniform(-10, 10)},
+         'is_carried': False}
+        for i in range(num_cubes)
+    ]
+    agent_states = []
+    for i in range(num_robots):
+        agent_states.append({
+            'id': str(i),
+            'state': {
+                'position': {'x': rng.uniform(-5, 5), 'y': 0, 'z': rng.uniform(-5, 5)},
+                'has_cube': rng.random() < carrying,
+                'available_cubes': [
+                    {'id': c['id'], 'position': dict(c['position']), 'is_carried': False}
+                    for c in cubes
+                ],
+                'time': time,
+            }
+        })
+    return {'agentStates': agent_states}
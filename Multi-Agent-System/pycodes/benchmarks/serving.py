@@ -0,0 +1,105 @@
+"""
+Throughput of the Flask dev server vs the ASGI mode (uvicorn) under concurrent clients.
+Each server runs in its own subprocess; clients are threads posting /get_decisions.
+
+    python -m benchmarks.serving --clients 1 4 16 --robots 20 --cubes 100
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.endpoints import percentile
+from benchmarks.payloads import make_world_state
+
+PYCODES = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def servers(port):
+    dev = [sys.executable, '-c', f"import Controller2; Controller2.app.run(port={port}, threaded=True)"]
+    asgi = [sys.executable, '-m', 'uvicorn', 'ControllerASGI:app', '--port', str(port),
+            '--log-level', 'warning', '--no-access-log']
+    return {
+        'flask dev': (dev, {}),
+        'asgi actor': (asgi, {'CONTROLLER_WORKER_MODEL': 'actor'}),
+        'asgi lock x4': (asgi, {'CONTROLLER_WORKER_MODEL': 'lock', 'CONTROLLER_THREADS': '4'}),
+        'asgi inline': (asgi, {'CONTROLLER_WORKER_MODEL': 'inline'}),
+    }
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def run_clients(port, body, num_clients, requests_per_client):
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        samples = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            connection.request('POST', '/get_decisions', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if response.will_close:
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port)
+            samples.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            latencies.extend(samples)
+
+    threads = [threading.Thread(target=client) for _ in range(num_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return len(latencies) / wall, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--robots', type=int, default=20)
+    parser.add_argument('--cubes', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=50, help='requests per client')
+    parser.add_argument('--port', type=int, default=5077)
+    args = parser.parse_args()
+
+    body = json.dumps(make_world_state(args.robots, args.cubes, carrying=0.3, time=1.0))
+    print(f"{'server':<14} {'clients':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, (command, extra_env) in servers(args.port).items():
+        env = {**os.environ, 'CONTROLLER_LOG_LEVEL': 'WARNING', **extra_env}
+        process = subprocess.Popen(command, cwd=PYCODES, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_port(args.port):
+                print(f"{name:<14} did not start (is uvicorn installed?)")
+                continue
+            run_clients(args.port, body, 1, 5)  # Warm up
+            for num_clients in args.clients:
+                rps, p50, p99 = run_clients(args.port, body, num_clients, args.requests)
+                print(f"{name:<14} {num_clients:>7} {rps:>9.1f} {p50:>9.2f} {p99:>9.2f}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Frames/sec and per-frame latency of YOLO inference as the number of camera agents grows,
+with the shared InferenceBatcher vs one forward pass per frame (max_batch=1). Agents are
+threads submitting synthetic 320x240 frames as fast as results come back.
+
+    python -m benchmarks.vision_batching --agents 1 2 4 8 16 --seconds 5
+"""
+import argparse
+import logging
+import threading
+import time
+
+import numpy as np
+
+from CameraController import InferenceBatcher, load_model
+from benchmarks.endpoints import percentile
+
+logging.getLogger('CameraController').setLevel(logging.WARNING)
+
+
+def run(model, num_agents, max_batch, max_wait_ms, seconds):
+    batcher = InferenceBatcher(model, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (240, 320, 3), dtype=np.uint8) for _ in range(num_agents)]
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def agent(agent_id):
+        samples = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            batcher.infer(agent_id, frames[agent_id])
+            samples.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(samples)
+
+    threads = [threading.Thread(target=agent, args=(i,)) for i in range(num_agents)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    batcher.stop()
+    stats = batcher.stats()
+    return len(latencies) / wall, percentile(latencies, 0.5) * 1000, stats['mean_batch']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--agents', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--max-batch', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    model, device = load_model()
+    modes = {'per-frame': (1, 0), 'batched': (args.max_batch, args.max_wait_ms)}
+    print(f"device: {device}")
+    print(f"{'agents':>6} {'mode':>10} {'fps':>8} {'p50 ms':>8} {'batch':>6}")
+    for num_agents in args.agents:
+        for name, (max_batch, max_wait_ms) in modes.items():
+            fps, p50, mean_batch = run(model, num_agents, max_batch, max_wait_ms, args.seconds)
+            print(f"{num_agents:>6} {name:>10} {fps:>8.1f} {p50:>8.1f} {mean_batch:>6.1f}")
+
+
+if __name__ == '__main__':
+    main()
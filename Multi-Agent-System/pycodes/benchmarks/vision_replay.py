@@ -0,0 +1,87 @@
+"""
+Throughput, drop rate and transport latency of the full AgentVisionReceiver pipeline
+on a recorded UDP capture (StreamCapture.py), at one or more replay speeds. Without
+--capture a synthetic one is built from images/, so it runs with no Unity and no GPU.
+
+    python StreamCapture.py record capture.rvcap --ports 5123-5127 --seconds 30
+    python -m benchmarks.vision_replay --capture capture.rvcap --speeds 1 2 4 0
+"""
+import argparse
+import glob
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from CameraController import AgentVisionReceiver
+from StreamCapture import replay, summarize, synthesize
+
+IMAGES = os.path.join(os.path.dirname(__file__), '..', '..', 'images', '*.png')
+
+logging.getLogger('CameraController').setLevel(logging.WARNING)
+
+
+def run(capture, num_agents, base_port, speed, loops, motion_gate):
+    receiver = AgentVisionReceiver(num_agents=num_agents, base_port=base_port,
+                                   headless=True, motion_gate=motion_gate)
+    try:
+        receiver.wait_ready()  # raises if the model could not be loaded
+        threading.Thread(target=receiver.start_receiving, daemon=True).start()
+        time.sleep(0.2)  # sockets bound
+
+        sent = replay(capture, speed=speed, base_port=base_port, loops=loops)
+        time.sleep(0.5)  # drain the pipeline
+        receiver._stop_pipeline()
+    except BaseException:
+        receiver.stop()
+        raise
+
+    transport = receiver.transport_stats().values()
+    frames = receiver.frame_stats().values()
+    completed = sum(t['frames'] for t in transport)
+    lost = sum(t['lost_frames'] for t in transport)
+    dropped = sum(f['dropped'] for f in frames)
+    annotated = receiver.pipeline_stats()['annotate']['processed']
+    latency = [t['mean_latency_ms'] for t in transport if t['frames']]
+    result = {
+        'sent_fps': completed / sent['seconds'],
+        'out_fps': annotated / sent['seconds'],
+        'loss': lost / (completed + lost) if completed + lost else 0.0,
+        'dropped': dropped / completed if completed else 0.0,
+        'latency_ms': sum(latency) / len(latency) if latency else 0.0,
+        'max_latency_ms': max((t['max_latency_ms'] for t in transport), default=0.0),
+        'replay_lag_ms': sent['max_lag_ms'],
+    }
+    receiver.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--capture', help="recorded capture; synthetic from images/ if omitted")
+    parser.add_argument('--speeds', type=float, nargs='+', default=[1, 2, 4, 0], help="0 = as fast as possible")
+    parser.add_argument('--agents', type=int, default=5, help="synthetic capture only")
+    parser.add_argument('--fps', type=float, default=30, help="synthetic capture only")
+    parser.add_argument('--seconds', type=float, default=5, help="synthetic capture only")
+    parser.add_argument('--base-port', type=int, default=5123)
+    parser.add_argument('--loops', type=int, default=1)
+    parser.add_argument('--no-motion-gate', action='store_true')
+    args = parser.parse_args()
+
+    capture = args.capture
+    if capture is None:
+        capture = os.path.join(tempfile.mkdtemp(), 'synthetic.rvcap')
+        synthesize(capture, sorted(glob.glob(IMAGES)), args.agents, args.fps, args.seconds, args.base_port)
+    info = summarize(capture)
+    num_agents = max(info['agents']) + 1
+    print(f"capture: {capture} ({num_agents} agents, {info['seconds']:.1f} s)")
+    print(f"{'speed':>6} {'in fps':>8} {'out fps':>8} {'lost':>6} {'dropped':>8} {'lat ms':>8} {'max ms':>8} {'lag ms':>8}")
+    for speed in args.speeds:
+        r = run(capture, num_agents, args.base_port, speed, args.loops, not args.no_motion_gate)
+        print(f"{speed or 'max':>6} {r['sent_fps']:>8.1f} {r['out_fps']:>8.1f} {r['loss']:>6.1%} "
+              f"{r['dropped']:>8.1%} {r['latency_ms']:>8.1f} {r['max_latency_ms']:>8.1f} {r['replay_lag_ms']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from FrameProtocol import Reassembler, split_frame  # noqa: E402
+
+
+def deliver(reassembler, agent_id, frame_id, payload, timestamp_ms, chunk_size=4):
+    frame = None
+    for datagram in split_frame(agent_id, frame_id, payload, timestamp_ms, chunk_size):
+        frame = reassembler.add(datagram)
+    return frame
+
+
+def test_reassembles_chunks_in_any_order():
+    reassembler = Reassembler()
+    datagrams = split_frame(1, 7, b'abcdefghij', 1000, chunk_size=4)
+    assert [reassembler.add(d) for d in reversed(datagrams[1:])] == [None, None]
+    frame = reassembler.add(datagrams[0])
+    assert (frame.agent_id, frame.frame_id, frame.payload) == (1, 7, b'abcdefghij')
+
+
+def test_late_chunks_of_delivered_frames_are_dropped():
+    reassembler = Reassembler()
+    late = split_frame(0, 9, b'old frame', 1000, chunk_size=4)
+    assert deliver(reassembler, 0, 10, b'new frame', 1033) is not None
+    assert all(reassembler.add(d) is None for d in late)
+    assert reassembler.stats()['late_chunks'] == len(late)
+    assert reassembler.stats()['restarts'] == 0
+
+
+def test_sender_restart_resets_frame_ids():
+    # CameraAgents.cs starts again at frame_id 0 on every play session
+    reassembler = Reassembler()
+    assert deliver(reassembler, 0, 1000, b'before', 50_000) is not None
+    first = deliver(reassembler, 0, 0, b'after restart', 60_000)
+    second = deliver(reassembler, 0, 1, b'next frame', 60_033)
+    assert first is not None and first.payload == b'after restart'
+    assert second is not None and second.frame_id == 1
+    assert reassembler.stats()['restarts'] == 1
+
+
+def test_large_backward_jump_is_a_restart_even_with_an_older_clock():
+    reassembler = Reassembler()
+    assert deliver(reassembler, 0, 5000, b'before', 50_000) is not None
+    assert deliver(reassembler, 0, 3, b'after restart', 40_000) is not None
+    assert reassembler.stats()['restarts'] == 1
@@ -0,0 +1,34 @@
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import Controller2  # noqa: E402
+from benchmarks.payloads import make_world_state  # noqa: E402
+
+logging.getLogger('Controller2').setLevel(logging.WARNING)
+
+
+def post(client, route, payload):
+    return client.post(route, data=json.dumps(payload), content_type='application/json')
+
+
+def test_delta_adding_an_agent_without_position_is_rejected():
+    Controller2.session = Controller2.WorldSession(3)
+    client = Controller2.app.test_client()
+    assert post(client, '/session/snapshot', make_world_state(3, 10)).status_code == 200
+    version = Controller2.session.version
+
+    response = post(client, '/session/delta', {'agents': [{'id': '7', 'state': {'has_cube': False}}]})
+    assert response.status_code == 400
+    assert 'position' in response.get_json()['error']
+    assert Controller2.session.version == version
+    assert '7' not in Controller2.session.agent_states
+
+    moved = {'agents': [{'id': '0', 'state': {'position': {'x': 1, 'y': 0, 'z': 1}}}], 'version': version}
+    response = post(client, '/session/delta', moved)
+    assert response.status_code == 200
+    assert response.get_json()['version'] == version + 1
+    assert client.get('/session/metrics').status_code == 200